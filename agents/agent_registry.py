@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Optional, Sequence, Tuple
+
+from langchain_core.runnables.config import RunnableConfig
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.constants import CONFIG_KEY_CHECKPOINTER
+from langgraph.graph.graph import CompiledGraph
+
+AgentKey = Tuple[str, FrozenSet[Tuple[str, int]]]
+AgentFactory = Callable[[str, Sequence[BaseTool]], CompiledGraph]
+
+
+class AgentRegistry:
+    """进程级的 agent 注册表
+
+    每个 (model, 工具集合) 只编译一次 agent graph, 在所有会话之间共享。
+    工具按名称和对象标识区分: MCP 工具重新加载后即使名称不变也是新的对象,
+    会编译新的 graph, 不会继续使用绑定旧工具对象的 graph。
+    graph 编译时不绑定 checkpointer, 由每个会话在调用时通过 config 传入。
+    工具路由会产生不同的工具子集, 注册表按 LRU 最多保留 max_size 个 graph。
+    """
+
+    def __init__(self, factory: AgentFactory, max_size: int = 64):
+        """初始化注册表
+
+        Args:
+            factory: 根据模型 ID 和工具列表创建 agent graph 的函数
+            max_size: 最多保留的 agent graph 数量
+        """
+        self._factory = factory
+        self._max_size = max_size
+        self._agents: "OrderedDict[AgentKey, CompiledGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, tools: Sequence[BaseTool]) -> AgentKey:
+        # 缓存的 graph 持有这些工具对象, 所以它们的 id 在缓存期间不会被复用
+        return model, frozenset((tool.name, id(tool)) for tool in tools)
+
+    def get(self, model: str, tools: Sequence[BaseTool]) -> CompiledGraph:
+        """获取已编译的 agent, 不存在时创建
+
+        Args:
+            model: Bedrock 模型 ID
+            tools: 绑定到 agent 的工具列表
+
+        Returns:
+            CompiledGraph: 共享的 agent graph
+        """
+        key = self.key(model, tools)
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is None:
+                agent = self._factory(model, list(tools))
+                self._agents[key] = agent
+                if len(self._agents) > self._max_size:
+                    self._agents.popitem(last=False)
+            else:
+                self._agents.move_to_end(key)
+            return agent
+
+    def clear(self):
+        """清空注册表, 释放绑定旧工具对象的 graph, 例如 MCP 工具重新加载之后"""
+        with self._lock:
+            self._agents.clear()
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+def agent_config(
+    thread_id: str,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    **kwargs,
+) -> RunnableConfig:
+    """构建调用共享 agent 的 config, 将会话自己的 checkpointer 传入 graph
+
+    Args:
+        thread_id: 会话线程 ID
+        checkpointer: 当前会话使用的 checkpointer
+        **kwargs: 其他 RunnableConfig 字段, 例如 callbacks, recursion_limit
+
+    Returns:
+        RunnableConfig: 调用 agent 时使用的配置
+    """
+    configurable = {"thread_id": thread_id}
+    if checkpointer is not None:
+        configurable[CONFIG_KEY_CHECKPOINTER] = checkpointer
+    return RunnableConfig(configurable=configurable, **kwargs)
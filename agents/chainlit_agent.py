@@ -1,246 +1,107 @@
-from typing import Any, Optional
+import os
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import BaseTool
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.graph import CompiledGraph
 from langchain_core.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
+from agents.agent_registry import AgentRegistry
+from agents.history import HistoryCompactor
+from agents.model_router import ModelRouter, ModelTier, RoutingDecision
+from agents.prompts import SystemPromptBuilder
+from agents.tool_router import ToolRouter
 from agents.tools.test import TestTool
 from bedrock_service import BedrockAIService, BedrockModel
-from mcp_client import get_mcp_tools
+from mcp_client import get_mcp_tool_groups, get_mcp_tools
 
-def create_chainlit_agent(checkpointer: Optional[MemorySaver] = None):
-    llm = BedrockAIService().llm_converse(model=BedrockModel.PRO_MODEL_ID.value)
+# 是否根据问题只绑定相关的工具
+TOOL_ROUTER_ENABLED = os.environ.get("TOOL_ROUTER_ENABLED", "true").lower() == "true"
+# 是否根据问题复杂度在 Haiku 和 Sonnet 之间选择模型
+MODEL_ROUTER_ENABLED = os.environ.get("MODEL_ROUTER_ENABLED", "true").lower() == "true"
 
-    tools = get_mcp_tools()
-    tools.extend(
-        [
-            TestTool(),
-            DuckDuckGoSearchRun()
-        ]
-    )
 
+def create_chainlit_agent(
+    model: str = BedrockModel.PRO_MODEL_ID.value,
+    tools: Optional[Sequence[BaseTool]] = None,
+) -> CompiledGraph:
+    llm = BedrockAIService().llm_converse(model=model)
+
+    if tools is None:
+        tools = get_chainlit_tools()
+
+    # system prompt 只包含与绑定工具相关的集成说明
+    tool_names = {bound_tool.name for bound_tool in tools}
+    servers = [
+        server for server, names in get_mcp_tool_groups().items() if tool_names & set(names)
+    ]
+    prompt_builder = SystemPromptBuilder(tool_names, servers)
+
+    # checkpointer 不在编译时绑定, 由每个会话通过 agent_config 传入
+    # 调用模型前先压缩历史消息, 控制每一轮发送的 token 数
     agent = create_react_agent(
         llm,
-        tools=tools,
-        prompt=__system_prompt(),
-        checkpointer=checkpointer
+        tools=list(tools),
+        prompt=_history_compactor.as_runnable() | prompt_builder.as_runnable(),
     )
     return agent
 
 
-def __system_prompt() -> Any:
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """你是一个有帮助的AI助手。请遵循以下原则：
-        1. 回答要准确、清晰、简洁但信息丰富
-        2. 保持专业友好的语气
-        3. 时间处理规则：
-           - 如果没有指定那一年，就是说的今年2025年
-
-        工具使用指南：
-        1. 使用 DuckDuckGoSearchRun 工具的情况：
-           - 需要最新新闻或当前事件信息
-           - 需要实时数据或统计，例如股票，天气等
-           - 需要验证具体事实
-           - 需要最新或特定信息时
-
-        3. 使用数学工具的情况：
-           - 需要进行精确的数学计算
-           - add: 用于加法运算
-           - multiply: 用于乘法运算
-           - 当需要确保计算准确性时
-
-        4. 使用 Feedmob mcp 工具的情况：
-           - 如果 提到 feedmob 中的 Uber 都是是指的 Uber Technologies，请使用这个替换来查询数据等信息
-           - 如果询问对比 spend, 如果用户没有说具体的日期，请询问用户要查询对比的日期
-           - get_client_infos: 获取客户详细信息
-             * 需要提供：
-               - 客户名称（支持模糊匹配）, 如果问 client Uber 都是指的 client_name = Uber Technologies
-             * 返回客户信息列表，包含：
-               - 客户ID（id）
-               - 客户名称（name）
-               - 创建时间（created_at）
-               - 更新时间（updated_at）
-               - 其他客户相关字段
-             * 使用场景：
-               - 查询客户基本信息
-               - 验证客户是否存在
-               - 获取客户ID用于其他操作
-             * 约束条件：
-               - 客户名称不能为空
-               - 支持模糊匹配（使用ilike）
-               - 返回空列表如果找不到匹配的客户
-
-           - get_jampp_campaign_mappings: 获取Jampp广告活动的映射关系
-             * 需要提供：
-               - 客户名称（必填）
-               - 供应商名称（可选，默认为"Jampp"）
-             * 返回映射记录列表，包含：
-               - 客户名称（client_name）
-               - 供应商名称（vendor_name）
-               - campaign_id（campaign_id，对应net_spends表）
-               - campaign_name（campaign_name，对应net_spends表）
-               - Jampp活动ID（jampp_campaign_id，对应Jampp系统）
-               - 客户ID（client_id）
-               - 供应商ID（vendor_id）
-             * 使用场景：
-               - 获取Jampp campaign id 与feedmob 中的 campaign_id 的 mapping 关系
-               - 验证活动映射配置
-               - 数据同步和对账
-             * 约束条件：
-               - 客户名称不能为空
-               - 返回空列表如果找不到匹配的映射关系
-
-           - get_client_vendor_direct_spend: 获取客户与供应商之间的直接支出数据
-             * 需要提供：client_name、vendor_name、start_date、end_date, 如果没有提供，就需要询问user这些信息，不要自己猜测
-             * 返回支出记录列表，包含：
-               - client_name
-               - vendor_name
-               - click_url_id
-               - campaign_id
-               - campaign_name
-               - spend_date
-               - 总额（gross）
-               - 净支出（net_spend）
-               - 活动ID（campaign_id）
-             * 数据来源：
-               - 从 PostgreSQL 数据库获取数据
-               - 使用 net_spends 表获取支出数据
-               - 自动处理多个campaign的数据聚合
-             * 数据库表关系：
-               - net_spends: 存储支出数据
-               - clients: 存储客户信息
-               - vendors: 存储供应商信息
-               - campaigns: 存储活动信息
-             * 使用场景：
-               - 分析特定客户与供应商之间的支出情况
-               - 追踪支出趋势和模式
-               - 生成财务报告
-             * 约束条件：
-               - 日期范围必须有效（结束日期不能早于开始日期）
-               - 客户名称和供应商名称不能为空
-               - 返回空列表如果找不到匹配的映射关系
-
-           - get_direct_spend_job_stats: 获取直接支出任务统计信息
-             * 需要提供（至少一个）：
-               - client_ids: 客户ID列表
-               - vendor_ids: 供应商ID列表
-               - click_url_ids: 点击URL ID列表
-               - job: 任务名称
-             * 返回任务统计记录，包含：
-               - click_url_ids: 点击URL ID数组
-               - client_ids: 客户ID数组
-               - vendor_ids: 供应商ID数组
-               - status: 任务状态（默认：1）
-               - data_source: 数据来源
-               - job: 任务名称
-               - notes: 任务备注
-               - schedule: 任务计划
-               - pm_users: PM用户数组
-               - pa_users: PA用户数组
-               - gross_spend_source: 总支出数据来源（对应客户的数据源，用于生成net_spends表中的gross_spend）
-               - net_spend_source: 净支出数据来源（对应供应商的数据源，用于生成net_spends表中的net_spend）
-               - date_from: 开始日期（默认：1）
-               - date_to: 结束日期（默认：1）
-               - risk: 风险标记（默认：false）
-             * 使用场景：
-               - 检查spend数据来源
-               - 验证net_spends表中数据的生成来源
-               - 追踪支出数据的同步任务
-             * 约束条件：
-               - 必须提供至少一个过滤参数
-               - 数组参数必须是整数列表
-               - 不返回已删除的记录
-
-        5. 使用 Jampp 工具的情况：
-           - get_jampp_all_supported_clients: 获取所有支持的广告客户端列表
-             * 用于查看可用的客户端
-             * 用于确认客户端名称是否有效
-           - get_jampp_reports: 获取广告报告数据
-             * 需要提供：客户端名称、开始日期、结束日期, 如果没有提供，就需要询问user这些信息，不要自己猜测
-             * 返回广告活动的详细数据（展示、点击、转化、支出等）
-             * 用于分析广告效果和投资回报
-
-        6. 使用 TestTool 工具的情况：
-           - 当询问test tool的时候时候
-
-        7. 使用 Inmobi 工具的情况：
-           - generate_inmobi_report_ids: 生成 Inmobi 报告 ID
-             * 需要提供：
-               - start_date: 开始日期（YYYY-MM-DD格式）
-               - end_date: 结束日期（YYYY-MM-DD格式）
-             * 返回包含两个报告ID的列表：[skan_report_id, non_skan_report_id]
-             * 使用场景：
-               - 初始化报告生成流程
-               - 获取后续查询所需的报告ID
-             * 注意事项：
-               - 需要保存返回的报告ID，用于后续状态查询和数据获取
-
-           - check_inmobi_report_status: 检查 Inmobi 报告状态
-             * 需要提供：
-               - report_id: 报告ID
-             * 返回报告状态：
-               - "report.status.available": 报告已生成完成，可以下载
-               - "report.status.running": 报告正在生成中
-               - "report.status.submitted": 查询已提交
-               - "report.status.failed": 查询失败
-             * 使用场景：
-               - 检查报告生成进度
-               - 确认报告是否可以下载
-             * 注意事项：
-               - 报告生成通常需要至少5分钟
-               - 如果状态不是"available"，需要等待后再次检查
-               - SKAN和非SKAN报告需要分别检查状态
-
-           - load_inmobi_campaign_reports: 下载和处理 Inmobi 广告活动数据
-             * 需要提供：
-               - report_id: 报告ID
-             * 返回CSV格式的报告数据
-             * 使用场景：
-               - 获取已生成完成的报告数据
-               - 分析广告活动效果
-             * 注意事项：
-               - 仅在报告状态为"report.status.available"时调用
-               - 返回数据为CSV格式
-
-        8. 使用 Iron Source 工具的情况：
-           - fetch_reports: 获取特定广告活动的报告数据
-             * 需要提供：开始日期、结束日期、campaign IDs列表
-             * 返回广告活动的详细数据（展示、点击、完成、安装、支出等）
-             * 用于分析特定广告活动的效果
-           - fetch_reports_by_bundleids: 获取特定应用包ID的报告数据
-             * 需要提供：开始日期、结束日期、bundle IDs列表
-             * 返回应用包相关的广告数据
-             * 用于分析特定应用的广告效果
-           - fetch_all_reports: 获取所有报告数据
-             * 需要提供：开始日期、结束日期
-             * 返回所有广告活动的数据
-             * 用于全面分析广告效果
-
-        9. 使用 postgres 读取 Feedmob 工具的情况：
-            - 表主要是feedmob 系统的业务功能，下面是如何获取 net_spend 的过程，表的关联关系如下举例：
-             * direct_spends 表主要获取 Feedmob 的 spend 数据
-             * clients 表获取 Uber Technologies 的 client id, 如果提到 uber 相关的 client 都是指的 client name = Uber Technologies
-             * 根据client_id 从 根据clients 获取对应 client 的 name
-             * 根据campaign_id 从 根据campaigns 获取对应 campaign 的 name
-             * 根据vendor_id 从 vendors表 获取对应 vendor 的 vendor_name
-             * direct_spends表中  net_spend_cents/100.0 就是 gross_spend, gross_spend_cents/100.0 就是 gross_spend, spend_date 时需要查询的日期
-
-        10. 使用 mongodb 读取 Feedmob 工具的情况：
-            - 表主要是feedmob 系统的业务功能，下面是如何获取 net_spend 的过程，表的关联关系如下举例：
-             * direct_spends 表主要获取 Feedmob 的 spend 数据
-             * clients 表获取 Uber Technologies 的 client id, 如果提到 uber 相关的 client 都是指的 client name = Uber Technologies
-             * 根据client_id 从 根据clients 获取对应 client 的 name
-             * 根据campaign_id 从 根据campaigns 获取对应 campaign 的 name
-             * 根据vendor_id 从 vendors表 获取对应 vendor 的 vendor_name
-             * direct_spends表中  net_spend_cents/100.0 就是 gross_spend, gross_spend_cents/100.0 就是 gross_spend, spend_date 时需要查询的日期
-
-        11. 直接回答（不使用工具）的情况：
-           - 基础知识问题
-           - 可以基于已有知识可靠回答的问题
-
-        在使用搜索工具前，请先判断是否真的需要外部信息。"""),
-        ("placeholder", "{messages}")
-    ])
-
-    return prompt
+_history_compactor = HistoryCompactor.from_env()
+_tool_router = ToolRouter(
+    top_k=int(os.environ.get("TOOL_ROUTER_TOP_K", "8")),
+    min_score=float(os.environ.get("TOOL_ROUTER_MIN_SCORE", "0.2")),
+)
+_model_router = ModelRouter(
+    min_confidence=float(os.environ.get("MODEL_ROUTER_MIN_CONFIDENCE", "0.6")),
+)
+_registry = AgentRegistry(factory=create_chainlit_agent)
+
+
+def get_chainlit_agent(
+    model: str = BedrockModel.PRO_MODEL_ID.value,
+    tools: Optional[Sequence[BaseTool]] = None,
+) -> CompiledGraph:
+    """获取进程内共享的 agent, 每个 (model, 工具集合) 只编译一次"""
+    if tools is None:
+        tools = get_chainlit_tools()
+    return _registry.get(model, tools)
+
+
+def route_chainlit_model(query: str) -> RoutingDecision:
+    """根据问题复杂度选择模型, 关闭路由时始终使用 Sonnet"""
+    if not MODEL_ROUTER_ENABLED:
+        return RoutingDecision(
+            tier=ModelTier.PRO,
+            model=BedrockModel.PRO_MODEL_ID.value,
+            confidence=1.0,
+            reason="model routing disabled",
+        )
+    return _model_router.route(query)
+
+
+async def select_chainlit_tools(query: str, sticky: Iterable[str] = ()) -> List[BaseTool]:
+    """根据用户问题选择需要绑定的工具, 相似度不足或路由失败时返回全部工具
+
+    Args:
+        query: 用户问题
+        sticky: 必须保留的工具名称, 例如本会话之前已经绑定过的工具
+    """
+    tools = get_chainlit_tools()
+    if not TOOL_ROUTER_ENABLED:
+        return tools
+    return await _tool_router.aselect(query, tools, groups=get_mcp_tool_groups(), sticky=sticky)
+
+
+def get_chainlit_tools() -> List[BaseTool]:
+    """MCP 工具加上本地工具, 每次返回新的列表, 不修改 MCP 共享的工具列表"""
+    return [*get_mcp_tools(), *__local_tools()]
+
+
+@lru_cache(maxsize=1)
+def __local_tools() -> tuple[BaseTool, ...]:
+    return (
+        TestTool(),
+        DuckDuckGoSearchRun(),
+    )
@@ -0,0 +1,491 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS
+
+logger = logging.getLogger(__name__)
+
+SPILL_SUFFIX = ".spill"
+
+# (序列化后的 checkpoint, 序列化后的 metadata, parent checkpoint id)
+CheckpointRecord = Tuple[Tuple[str, bytes], Tuple[str, bytes], Optional[str]]
+# (task id, channel, 序列化后的值, task path)
+WriteRecord = Tuple[str, str, Tuple[str, bytes], str]
+
+
+@dataclass
+class _ThreadState:
+    """一个线程（会话）在内存中的全部 checkpoint"""
+
+    # checkpoint NS -> checkpoint ID -> checkpoint, 按写入顺序排列
+    checkpoints: Dict[str, "OrderedDict[str, CheckpointRecord]"] = field(default_factory=dict)
+    # (checkpoint NS, checkpoint ID) -> (task ID, write idx) -> write
+    writes: Dict[Tuple[str, str], Dict[Tuple[str, int], WriteRecord]] = field(default_factory=dict)
+    size: int = 0
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class BoundedMemorySaver(BaseCheckpointSaver[str]):
+    """有内存上限的 checkpointer
+
+    所有会话共享一个进程级实例:
+    - 全局内存预算, 超出时按 LRU 把最久未访问的线程写入本地磁盘
+    - 空闲超过 ttl 的线程同样写入磁盘, 下次访问时再加载回内存
+    - 每个线程最多保留 max_versions 个 checkpoint 版本
+    - 磁盘上超过 disk_ttl 的线程文件会被删除, 每 purge_interval 秒最多清理一次
+
+    线程文件用 serde 序列化, 写入只有当前用户可访问的目录（0o700）。
+    异步方法在线程池中执行, 写盘和加载不会阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600,
+        max_versions: int = 20,
+        spill_dir: Optional[str] = None,
+        disk_ttl: float = 15 * 24 * 3600,
+        purge_interval: float = 3600,
+        serde=None,
+    ):
+        """初始化 checkpointer
+
+        Args:
+            max_bytes: 内存中所有线程 checkpoint 的总字节数上限
+            ttl: 线程空闲多少秒后写入磁盘
+            max_versions: 每个线程（每个 checkpoint NS）保留的 checkpoint 版本数, 至少为 2
+            spill_dir: 冷线程写入的目录, 默认为 data/checkpoint_spill
+            disk_ttl: 磁盘上的线程文件保留多少秒
+            purge_interval: 两次清理过期线程文件之间至少间隔的秒数
+            serde: checkpoint 序列化器
+        """
+        super().__init__(serde=serde)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_versions = max(2, max_versions)
+        self.disk_ttl = disk_ttl
+        self.purge_interval = purge_interval
+        self.spill_dir = spill_dir or os.path.join("data", "checkpoint_spill")
+        _ensure_private_dir(self.spill_dir)
+
+        self._threads: "OrderedDict[str, _ThreadState]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+        self._last_purge = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> "BoundedMemorySaver":
+        """根据环境变量创建 checkpointer"""
+        return cls(
+            max_bytes=int(os.environ.get("CHECKPOINT_MEMORY_BUDGET_MB", "256")) * 1024 * 1024,
+            ttl=float(os.environ.get("CHECKPOINT_THREAD_TTL_SECONDS", "3600")),
+            max_versions=int(os.environ.get("CHECKPOINT_MAX_VERSIONS", "20")),
+            spill_dir=os.environ.get("CHECKPOINT_SPILL_DIR") or None,
+            disk_ttl=float(os.environ.get("CHECKPOINT_DISK_TTL_SECONDS", str(15 * 24 * 3600))),
+        )
+
+    @property
+    def size(self) -> int:
+        """内存中 checkpoint 的总字节数"""
+        return self._size
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            state = self._load_thread(thread_id)
+            if state is None:
+                return None
+            checkpoints = state.checkpoints.get(checkpoint_ns)
+            if not checkpoints:
+                return None
+            checkpoint_id = get_checkpoint_id(config) or max(checkpoints)
+            record = checkpoints.get(checkpoint_id)
+            if record is None:
+                return None
+            return self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, record, state)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            results = self._list_tuples(config, filter, before, limit)
+        yield from results
+
+    def _list_tuples(
+        self,
+        config: Optional[RunnableConfig],
+        filter: Optional[Dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> List[CheckpointTuple]:
+        if config is not None:
+            thread_id = config["configurable"]["thread_id"]
+            state = self._load_thread(thread_id)
+            threads = [(thread_id, state)] if state is not None else []
+        else:
+            # 包括已写入磁盘的线程, 只读取不加载回内存
+            threads = list(self._threads.items()) + list(self._spilled_threads())
+
+        config_checkpoint_ns = config["configurable"].get("checkpoint_ns") if config else None
+        config_checkpoint_id = get_checkpoint_id(config) if config else None
+        before_checkpoint_id = get_checkpoint_id(before) if before else None
+
+        results: List[CheckpointTuple] = []
+        for thread_id, state in threads:
+            for checkpoint_ns, checkpoints in state.checkpoints.items():
+                if config_checkpoint_ns is not None and checkpoint_ns != config_checkpoint_ns:
+                    continue
+                for checkpoint_id in sorted(checkpoints, reverse=True):
+                    if config_checkpoint_id and checkpoint_id != config_checkpoint_id:
+                        continue
+                    if before_checkpoint_id and checkpoint_id >= before_checkpoint_id:
+                        continue
+                    record = checkpoints[checkpoint_id]
+                    metadata = self.serde.loads_typed(record[1])
+                    if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                    if limit is not None and len(results) >= limit:
+                        return results
+                    results.append(
+                        self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, record, state)
+                    )
+        return results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        record: CheckpointRecord = (
+            self.serde.dumps_typed(checkpoint),
+            self.serde.dumps_typed(metadata),
+            config["configurable"].get("checkpoint_id"),
+        )
+        with self._lock:
+            state = self._load_thread(thread_id, create=True)
+            checkpoints = state.checkpoints.setdefault(checkpoint_ns, OrderedDict())
+            checkpoints[checkpoint["id"]] = record
+            self._resize(state, _record_size(record))
+            self._trim_versions(state, checkpoint_ns)
+            self._enforce_budget(current=thread_id)
+        self._maybe_purge_spills()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            state = self._load_thread(thread_id, create=True)
+            outer_writes = state.writes.setdefault((checkpoint_ns, checkpoint_id), {})
+            added = 0
+            for idx, (channel, value) in enumerate(writes):
+                inner_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if inner_key[1] >= 0 and inner_key in outer_writes:
+                    continue
+                typed = self.serde.dumps_typed(value)
+                outer_writes[inner_key] = (task_id, channel, typed, task_path)
+                added += len(typed[1])
+            self._resize(state, added)
+            self._enforce_budget(current=thread_id)
+        self._maybe_purge_spills()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """删除一个线程在内存和磁盘上的所有 checkpoint"""
+        with self._lock:
+            state = self._threads.pop(thread_id, None)
+            if state is not None:
+                self._size -= state.size
+            path = self._spill_path(thread_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _to_tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        record: CheckpointRecord,
+        state: _ThreadState,
+    ) -> CheckpointTuple:
+        checkpoint_typed, metadata_typed, parent_checkpoint_id = record
+        checkpoint = self.serde.loads_typed(checkpoint_typed)
+        if parent_checkpoint_id:
+            parent_writes = state.writes.get((checkpoint_ns, parent_checkpoint_id), {})
+            checkpoint["pending_sends"] = [
+                self.serde.loads_typed(write[2])
+                for write in parent_writes.values()
+                if write[1] == TASKS
+            ]
+        writes = state.writes.get((checkpoint_ns, checkpoint_id), {})
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed(metadata_typed),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in writes.values()
+            ],
+        )
+
+    def _load_thread(self, thread_id: str, create: bool = False) -> Optional[_ThreadState]:
+        """返回线程状态, 必要时从磁盘加载, 并标记为最近访问"""
+        state = self._threads.get(thread_id)
+        if state is None:
+            state = self._read_spill(thread_id)
+            if state is None:
+                if not create:
+                    return None
+                state = _ThreadState()
+            self._threads[thread_id] = state
+            self._size += state.size
+            self._threads.move_to_end(thread_id)
+            state.last_access = time.monotonic()
+            self._enforce_budget(current=thread_id)
+            return state
+        self._threads.move_to_end(thread_id)
+        state.last_access = time.monotonic()
+        return state
+
+    def _resize(self, state: _ThreadState, delta: int):
+        state.size += delta
+        self._size += delta
+
+    def _trim_versions(self, state: _ThreadState, checkpoint_ns: str):
+        """只保留最近 max_versions 个 checkpoint 及其 writes"""
+        checkpoints = state.checkpoints[checkpoint_ns]
+        while len(checkpoints) > self.max_versions:
+            checkpoint_id, record = checkpoints.popitem(last=False)
+            freed = _record_size(record)
+            writes = state.writes.pop((checkpoint_ns, checkpoint_id), {})
+            freed += sum(len(write[2][1]) for write in writes.values())
+            self._resize(state, -freed)
+
+    def _enforce_budget(self, current: Optional[str] = None):
+        """把空闲超时的线程和超出内存预算的 LRU 线程写入磁盘"""
+        now = time.monotonic()
+        for thread_id in list(self._threads):
+            state = self._threads[thread_id]
+            if thread_id != current and now - state.last_access > self.ttl:
+                self._spill(thread_id)
+
+        while self._size > self.max_bytes and len(self._threads) > 1:
+            thread_id = next(iter(self._threads))
+            if thread_id == current:
+                break
+            self._spill(thread_id)
+
+    def _spill(self, thread_id: str):
+        state = self._threads.pop(thread_id)
+        self._size -= state.size
+        path = self._spill_path(thread_id)
+        tmp_path = f"{path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._encode_state(thread_id, state))
+        os.replace(tmp_path, path)
+        logger.debug("Spilled checkpoint thread %s (%d bytes) to disk", thread_id, state.size)
+
+    def _read_spill(self, thread_id: str) -> Optional[_ThreadState]:
+        path = self._spill_path(thread_id)
+        if not os.path.exists(path):
+            return None
+        loaded = self._read_spill_file(path)
+        if loaded is None or loaded[0] != thread_id:
+            return None
+        os.remove(path)
+        state = loaded[1]
+        logger.debug("Reloaded checkpoint thread %s (%d bytes) from disk", thread_id, state.size)
+        return state
+
+    def _read_spill_file(self, path: str) -> Optional[Tuple[str, _ThreadState]]:
+        try:
+            with open(path, "rb") as f:
+                type_, _, data = f.read().partition(b"\n")
+            return self._decode_state(self.serde.loads_typed((type_.decode("utf-8"), data)))
+        except Exception as e:
+            logger.warning("Failed to reload checkpoint thread file %s: %s", path, e)
+            return None
+
+    def _spilled_threads(self) -> Iterator[Tuple[str, _ThreadState]]:
+        """磁盘上的线程, 不加载回内存"""
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith(SPILL_SUFFIX):
+                continue
+            loaded = self._read_spill_file(os.path.join(self.spill_dir, name))
+            if loaded is not None and loaded[0] not in self._threads:
+                yield loaded
+
+    def _encode_state(self, thread_id: str, state: _ThreadState) -> bytes:
+        """把线程状态转换为只含基本类型的结构, 再用 serde 序列化"""
+        payload = {
+            "thread_id": thread_id,
+            "size": state.size,
+            "checkpoints": [
+                [
+                    checkpoint_ns,
+                    [
+                        [checkpoint_id, list(checkpoint), list(metadata), parent_checkpoint_id]
+                        for checkpoint_id, (checkpoint, metadata, parent_checkpoint_id) in checkpoints.items()
+                    ],
+                ]
+                for checkpoint_ns, checkpoints in state.checkpoints.items()
+            ],
+            "writes": [
+                [
+                    checkpoint_ns,
+                    checkpoint_id,
+                    [
+                        [task_id, idx, channel, list(value), task_path]
+                        for (task_id, idx), (_, channel, value, task_path) in writes.items()
+                    ],
+                ]
+                for (checkpoint_ns, checkpoint_id), writes in state.writes.items()
+            ],
+        }
+        type_, data = self.serde.dumps_typed(payload)
+        return type_.encode("utf-8") + b"\n" + data
+
+    @staticmethod
+    def _decode_state(payload: Dict[str, Any]) -> Tuple[str, _ThreadState]:
+        state = _ThreadState(size=payload["size"])
+        for checkpoint_ns, checkpoints in payload["checkpoints"]:
+            state.checkpoints[checkpoint_ns] = OrderedDict(
+                (checkpoint_id, (tuple(checkpoint), tuple(metadata), parent_checkpoint_id))
+                for checkpoint_id, checkpoint, metadata, parent_checkpoint_id in checkpoints
+            )
+        for checkpoint_ns, checkpoint_id, writes in payload["writes"]:
+            state.writes[(checkpoint_ns, checkpoint_id)] = {
+                (task_id, idx): (task_id, channel, tuple(value), task_path)
+                for task_id, idx, channel, value, task_path in writes
+            }
+        return payload["thread_id"], state
+
+    def _maybe_purge_spills(self):
+        """每 purge_interval 秒最多清理一次过期的线程文件, 不持有锁"""
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        cutoff = time.time() - self.disk_ttl
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _spill_path(self, thread_id: str) -> str:
+        digest = hashlib.sha1(thread_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}{SPILL_SUFFIX}")
+
+
+def _ensure_private_dir(path: str):
+    """创建只有当前用户可访问的目录; 目录属于其他用户时拒绝使用"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.stat(path)
+    if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+        raise PermissionError(f"Checkpoint spill directory {path} is owned by another user")
+    if stat.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+def _record_size(record: CheckpointRecord) -> int:
+    return len(record[0][1]) + len(record[1][1])
@@ -0,0 +1,533 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+-- 两个主键都以 thread_id 开头, 单独的 thread_id 索引是多余的; 删除旧版本创建的索引
+DROP INDEX IF EXISTS checkpoints_thread_id_idx;
+DROP INDEX IF EXISTS writes_thread_id_idx;
+"""
+
+INSERT_CHECKPOINT = """
+INSERT OR REPLACE INTO checkpoints
+(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_WRITE = """
+INSERT OR REPLACE INTO writes
+(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_WRITE = UPSERT_WRITE.replace("INSERT OR REPLACE", "INSERT OR IGNORE")
+
+
+class _Write:
+    """一个待提交的写操作, 提交结果通过 future 返回给入队它的调用方"""
+
+    __slots__ = ("thread_id", "query", "rows", "future")
+
+    def __init__(self, thread_id: str, query: str, rows: List[Tuple]):
+        self.thread_id = thread_id
+        self.query = query
+        self.rows = rows
+        self.future: "concurrent.futures.Future[None]" = concurrent.futures.Future()
+
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """基于本地 SQLite（WAL 模式）的持久化 checkpointer
+
+    - 写操作放入队列, 由后台写线程提交, 不阻塞事件循环; 队列空闲时立即提交,
+      写入密集时把已经排队的写操作合并到一个事务, 不为凑批额外等待;
+      put 等待自己的写操作提交, 提交失败时错误返回给这个 put
+    - 读操作先等待同一会话尚未提交的写入落盘, 然后在线程池中查询
+    - checkpoint 使用 serde 的 msgpack 二进制格式保存
+    - 同一个数据库文件可以被多个 uvicorn worker 共享
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        batch_size: int = 200,
+        write_timeout: float = 30,
+        serde=None,
+    ):
+        """初始化 checkpointer
+
+        Args:
+            path: SQLite 数据库文件路径
+            batch_size: 每个事务最多提交的写操作数量
+            write_timeout: 等待写操作提交的最长秒数
+            serde: checkpoint 序列化器
+        """
+        super().__init__(serde=serde)
+        self.path = path
+        self.batch_size = batch_size
+        self.write_timeout = write_timeout
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        # thread_id -> 尚未提交的写操作
+        self._pending: Dict[str, Set["concurrent.futures.Future[None]"]] = {}
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-checkpointer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> "SqliteSaver":
+        """根据环境变量创建 checkpointer"""
+        return cls(
+            os.environ.get("CHECKPOINT_SQLITE_PATH", os.path.join("data", "checkpoints.sqlite")),
+            batch_size=int(os.environ.get("CHECKPOINT_SQLITE_BATCH_SIZE", "200")),
+            write_timeout=float(os.environ.get("CHECKPOINT_SQLITE_WRITE_TIMEOUT", "30")),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        self.flush(thread_id)
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        conn = self._reader()
+        if checkpoint_id:
+            row = conn.execute(
+                "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return self._to_tuple(conn, thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush(config["configurable"]["thread_id"] if config is not None else None)
+        conn = self._reader()
+        where, params = [], []
+        if config is not None:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY checkpoint_id DESC"
+        # metadata 是二进制格式, 有 filter 时只能在 Python 中过滤, 不能在 SQL 中 LIMIT
+        if limit is not None and not filter:
+            query += f" LIMIT {int(limit)}"
+
+        results: List[CheckpointTuple] = []
+        for thread_id, checkpoint_ns, *row in conn.execute(query, params).fetchall():
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            results.append(self._to_tuple(conn, thread_id, checkpoint_ns, row))
+            if limit is not None and len(results) >= limit:
+                break
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        future, next_config = self._enqueue_checkpoint(config, checkpoint, metadata)
+        self._wait([future])
+        return next_config
+
+    def _enqueue_checkpoint(
+        self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata
+    ) -> Tuple["concurrent.futures.Future[None]", RunnableConfig]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        future = self._enqueue(
+            thread_id,
+            INSERT_CHECKPOINT,
+            [
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    metadata_type,
+                    serialized_metadata,
+                )
+            ],
+        )
+        return future, {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._wait([self._enqueue_writes(config, writes, task_id, task_path)])
+
+    def _enqueue_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str,
+    ) -> "concurrent.futures.Future[None]":
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        query = UPSERT_WRITE if all(channel in WRITES_IDX_MAP for channel, _ in writes) else INSERT_WRITE
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    type_,
+                    serialized_value,
+                    task_path,
+                )
+            )
+        return self._enqueue(thread_id, query, rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """删除一个线程的所有 checkpoint 和 writes"""
+        self._wait([
+            self._enqueue(thread_id, "DELETE FROM checkpoints WHERE thread_id = ?", [(thread_id,)]),
+            self._enqueue(thread_id, "DELETE FROM writes WHERE thread_id = ?", [(thread_id,)]),
+        ])
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # 序列化在线程池中完成, 落盘由写线程完成; 等待提交时不占用事件循环
+        future, next_config = await asyncio.to_thread(self._enqueue_checkpoint, config, checkpoint, metadata)
+        await self._await(future)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        future = await asyncio.to_thread(self._enqueue_writes, config, writes, task_id, task_path)
+        await self._await(future)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def flush(self, thread_id: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        """等待一个线程（默认所有线程）已入队的写操作提交到数据库
+
+        写操作失败的错误由入队它的 put 处理, 这里只等待, 不抛出。
+        """
+        with self._pending_lock:
+            if thread_id is None:
+                futures = [future for pending in self._pending.values() for future in pending]
+            else:
+                futures = list(self._pending.get(thread_id, ()))
+        if futures:
+            self._wait(futures, timeout=timeout, raise_errors=False)
+
+    def close(self) -> None:
+        """提交剩余的写操作并停止写线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(self.write_timeout)
+
+    def _enqueue(self, thread_id: str, query: str, rows: List[Tuple]) -> "concurrent.futures.Future[None]":
+        if self._closed:
+            raise RuntimeError("SqliteSaver is closed")
+        if not self._writer.is_alive():
+            raise RuntimeError("SqliteSaver writer thread is not running")
+        item = _Write(thread_id, query, rows)
+        with self._pending_lock:
+            self._pending.setdefault(thread_id, set()).add(item.future)
+        item.future.add_done_callback(lambda future: self._discard_pending(thread_id, future))
+        self._queue.put(item)
+        return item.future
+
+    def _discard_pending(self, thread_id: str, future: "concurrent.futures.Future[None]") -> None:
+        with self._pending_lock:
+            pending = self._pending.get(thread_id)
+            if pending is not None:
+                pending.discard(future)
+                if not pending:
+                    del self._pending[thread_id]
+
+    def _wait(
+        self,
+        futures: Iterable["concurrent.futures.Future[None]"],
+        timeout: Optional[float] = None,
+        raise_errors: bool = True,
+    ) -> None:
+        """等待写操作提交; 超时或写线程已停止时抛出异常, 而不是一直阻塞"""
+        deadline = time.monotonic() + (self.write_timeout if timeout is None else timeout)
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+            if raise_errors:
+                for future in done:
+                    future.result()
+            if not pending:
+                break
+            if not self._writer.is_alive():
+                raise RuntimeError("SqliteSaver writer thread stopped with writes pending")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Checkpoint writes to {self.path} not committed within {self.write_timeout}s")
+
+    async def _await(self, future: "concurrent.futures.Future[None]") -> None:
+        # shield: 超时不取消 future, 写线程仍会提交这个写操作
+        await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.write_timeout)
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch: List[_Write] = []
+            try:
+                item = self._queue.get()
+                # 只合并已经在排队的写操作, 队列一空就提交, 不等待后续写入
+                while True:
+                    if item is None:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                    if stopping or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if batch:
+                    self._commit(conn, batch)
+            except Exception as e:
+                # 写线程不能退出, 否则之后入队的写操作永远不会提交
+                logger.exception("Checkpoint writer failed")
+                for item in batch:
+                    _resolve(item.future, e)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]) -> None:
+        try:
+            self._execute(conn, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.exception("Failed to write checkpoints to %s", self.path)
+                _resolve(batch[0].future, e)
+                return
+            # 逐个重试, 只让出错的写操作失败, 同一批次的其他写操作照常提交
+            logger.warning("Checkpoint batch of %d writes failed, retrying them one by one: %s", len(batch), e)
+            for item in batch:
+                self._commit(conn, [item])
+            return
+        for item in batch:
+            _resolve(item.future)
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, batch: List[_Write]) -> None:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for item in batch:
+                conn.executemany(item.query, item.rows)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _reader(self) -> sqlite3.Connection:
+        """每个线程使用自己的只读连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _to_tuple(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        row: Sequence[Any],
+    ) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        checkpoint_ = self.serde.loads_typed((type_, checkpoint))
+        if parent_checkpoint_id:
+            sends = conn.execute(
+                "SELECT type, value FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? "
+                "ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+            ).fetchall()
+            checkpoint_["pending_sends"] = [self.serde.loads_typed(send) for send in sends]
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=checkpoint_,
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in writes
+            ],
+        )
+
+
+def _resolve(future: "concurrent.futures.Future[None]", error: Optional[BaseException] = None) -> None:
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from agents.tokens import count_messages_tokens, count_tokens, message_text
+from bedrock_service import BedrockAIService, BedrockModel
+
+logger = logging.getLogger(__name__)
+
+Turn = List[BaseMessage]
+
+SUMMARY_PROMPT = """请用简洁的中文总结下面这段用户与 AI 助手之间的对话, 供后续对话参考。
+要求：
+1. 保留客户名称、供应商名称、日期范围、campaign/report ID 等关键参数
+2. 保留工具查询得到的关键数字和结论, 不需要保留原始数据明细
+3. 保留用户尚未解决的问题和约定的偏好
+4. 不要编造对话中没有的信息"""
+
+SUMMARY_PREFIX = "以下是之前对话的摘要（更早的消息已被压缩）：\n"
+
+
+class HistoryCompactor:
+    """在调用模型前压缩对话历史, 控制每一轮发送的 token 数
+
+    - 历史 token 数在预算内时原样返回
+    - 最近 keep_turns 轮保持原样（之前轮次的工具结果会压缩为摘要片段）
+    - 更早的轮次用更便宜的模型总结为一条 system 消息, 摘要按对话前缀缓存, 增量更新
+    - 仍然超出预算时, 继续把最早的近期轮次并入摘要, 当前轮始终保留
+    """
+
+    def __init__(
+        self,
+        *,
+        token_budget: int = 24000,
+        keep_turns: int = 4,
+        tool_digest_chars: int = 500,
+        summary_reserve_tokens: int = 1024,
+        summary_model: str = BedrockModel.PLUS_MODEL_ID.value,
+        cache_size: int = 512,
+    ):
+        """初始化历史压缩器
+
+        Args:
+            token_budget: 每次调用模型时历史消息的 token 预算
+            keep_turns: 原样保留的最近轮数（一轮从一条用户消息开始）
+            tool_digest_chars: 压缩后的工具结果保留的字符数
+            summary_reserve_tokens: 为摘要预留的 token 数
+            summary_model: 用于总结旧对话的模型
+            cache_size: 摘要缓存的条数
+        """
+        self.token_budget = token_budget
+        self.keep_turns = max(1, keep_turns)
+        self.tool_digest_chars = tool_digest_chars
+        self.summary_reserve_tokens = summary_reserve_tokens
+        self.summary_model = summary_model
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._llm = None
+
+    @classmethod
+    def from_env(cls) -> "HistoryCompactor":
+        """根据环境变量创建历史压缩器"""
+        return cls(
+            token_budget=int(os.environ.get("HISTORY_TOKEN_BUDGET", "24000")),
+            keep_turns=int(os.environ.get("HISTORY_KEEP_TURNS", "4")),
+            tool_digest_chars=int(os.environ.get("HISTORY_TOOL_DIGEST_CHARS", "500")),
+        )
+
+    def as_runnable(self) -> Runnable:
+        """返回一个 Runnable: 输入 agent state, 输出压缩了 messages 的 state"""
+        return RunnableLambda(self.compact_state, afunc=self.acompact_state, name="compact_history")
+
+    def compact_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {**state, "messages": self.compact(state["messages"])}
+
+    async def acompact_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {**state, "messages": await self.acompact(state["messages"])}
+
+    def compact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        plan = self._plan(messages)
+        if plan is None:
+            return list(messages)
+        old_turns, recent = plan
+        return self._build(self._summarize(old_turns), recent)
+
+    async def acompact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        plan = self._plan(messages)
+        if plan is None:
+            return list(messages)
+        old_turns, recent = plan
+        return self._build(await self._asummarize(old_turns), recent)
+
+    def _plan(self, messages: Sequence[BaseMessage]) -> Optional[Tuple[List[Turn], List[Turn]]]:
+        """拆分出需要总结的旧轮次和保留的近期轮次, 不需要压缩时返回 None"""
+        if count_messages_tokens(messages) <= self.token_budget:
+            return None
+
+        turns = _split_turns(messages)
+        old_turns, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+        # 当前轮的工具结果是模型这一步需要的, 只压缩之前轮次的工具结果
+        recent = [[self._digest(m) for m in turn] for turn in recent[:-1]] + recent[-1:]
+
+        budget = self.token_budget - self.summary_reserve_tokens
+        while len(recent) > 1 and count_messages_tokens([m for turn in recent for m in turn]) > budget:
+            old_turns.append(turns[len(old_turns)])
+            recent.pop(0)
+
+        logger.info(
+            "Compacting history: %d turns summarized, %d turns kept",
+            len(old_turns),
+            len(recent),
+        )
+        return old_turns, recent
+
+    def _build(self, summary: Optional[str], recent: List[Turn]) -> List[BaseMessage]:
+        messages = [m for turn in recent for m in turn]
+        if summary:
+            messages.insert(0, SystemMessage(content=SUMMARY_PREFIX + summary))
+        return messages
+
+    def _summarize(self, old_turns: List[Turn]) -> Optional[str]:
+        if not old_turns:
+            return None
+        key, previous, pending = self._summary_inputs(old_turns)
+        if not pending:
+            return previous
+        try:
+            # 不继承调用方的 callbacks, 避免摘要的 token 被流式推送给用户
+            response = self._summary_llm().invoke(
+                self._summary_messages(previous, pending), config={"callbacks": []}
+            )
+        except Exception as e:
+            logger.warning("History summarization failed, dropping old turns: %s", e)
+            return previous
+        return self._store_summary(key, message_text(response))
+
+    async def _asummarize(self, old_turns: List[Turn]) -> Optional[str]:
+        if not old_turns:
+            return None
+        key, previous, pending = self._summary_inputs(old_turns)
+        if not pending:
+            return previous
+        try:
+            # 不继承调用方的 callbacks, 避免摘要的 token 被流式推送给用户
+            response = await self._summary_llm().ainvoke(
+                self._summary_messages(previous, pending), config={"callbacks": []}
+            )
+        except Exception as e:
+            logger.warning("History summarization failed, dropping old turns: %s", e)
+            return previous
+        return self._store_summary(key, message_text(response))
+
+    def _summary_inputs(self, old_turns: List[Turn]) -> Tuple[str, Optional[str], List[Turn]]:
+        """找到已缓存的最长前缀摘要, 返回 (缓存 key, 前缀摘要, 还需要总结的轮次)"""
+        keys = _prefix_keys(old_turns)
+        for count in range(len(old_turns), 0, -1):
+            previous = self._summaries.get(keys[count - 1])
+            if previous is not None:
+                self._summaries.move_to_end(keys[count - 1])
+                return keys[-1], previous, old_turns[count:]
+        return keys[-1], None, old_turns
+
+    def _summary_messages(self, previous: Optional[str], turns: List[Turn]) -> List[BaseMessage]:
+        lines = []
+        if previous:
+            lines.append(f"之前的摘要：\n{previous}\n")
+        for turn in turns:
+            for message in turn:
+                message = self._digest(message)
+                lines.append(f"[{message.type}] {message_text(message)}")
+                for tool_call in getattr(message, "tool_calls", None) or []:
+                    lines.append(f"[tool_call] {tool_call['name']}({tool_call['args']})")
+        return [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content="\n".join(lines)),
+        ]
+
+    def _store_summary(self, key: str, summary: str) -> str:
+        self._summaries[key] = summary
+        if len(self._summaries) > self._cache_size:
+            self._summaries.popitem(last=False)
+        logger.info("History summary: %d tokens", count_tokens(summary))
+        return summary
+
+    def _digest(self, message: BaseMessage) -> BaseMessage:
+        """把过长的工具结果压缩为开头片段, 保留 tool_call_id 以匹配工具调用"""
+        if not isinstance(message, ToolMessage):
+            return message
+        text = message_text(message)
+        if len(text) <= self.tool_digest_chars:
+            return message
+        digest = (
+            f"[工具 {message.name or ''} 的结果已压缩, 原始长度 {len(text)} 字符, 以下为开头部分]\n"
+            f"{text[:self.tool_digest_chars]}"
+        )
+        return message.model_copy(
+            update={"content": digest, "id": f"{message.id}:digest" if message.id else None}
+        )
+
+    def _summary_llm(self):
+        if self._llm is None:
+            self._llm = BedrockAIService().llm_converse(model=self.summary_model, max_tokens=self.summary_reserve_tokens)
+        return self._llm
+
+
+def _split_turns(messages: Sequence[BaseMessage]) -> List[Turn]:
+    """按用户消息把历史拆分为轮次, 工具调用和工具结果始终在同一轮"""
+    turns: List[Turn] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _prefix_keys(turns: List[Turn]) -> List[str]:
+    """每个轮次前缀的缓存 key, 基于消息 id（没有 id 时使用内容）"""
+    digest = hashlib.sha1()
+    keys = []
+    for turn in turns:
+        for message in turn:
+            digest.update((message.id or message_text(message)).encode("utf-8"))
+        keys.append(digest.hexdigest())
+    return keys
@@ -0,0 +1,117 @@
+import logging
+import re
+from dataclasses import dataclass
+from enum import Enum
+
+from bedrock_service import BedrockModel
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 需要多步推理的信号: 对比、分析、归因、规划等
+COMPLEX_PATTERNS = [
+    r"对比", r"比较", r"分析", r"为什么", r"原因", r"趋势", r"差异", r"异常", r"预测",
+    r"建议", r"计划", r"方案", r"评估", r"解释", r"归因", r"优化", r"每个.*分别", r"哪些.*最",
+    r"\bcompar", r"\banaly", r"\bwhy\b", r"\btrend", r"\bdifferen", r"\bvs\.?\b", r"\bversus\b",
+    r"\bexplain", r"\bplan\b", r"\brecommend", r"\bforecast", r"\bstep by step\b", r"\broot cause",
+]
+
+# 简单查询的信号: 查某个值、列出、获取报表
+SIMPLE_PATTERNS = [
+    r"查询", r"查一下", r"获取", r"多少", r"列出", r"是什么", r"有哪些", r"报告", r"数据",
+    r"spend", r"\bget\b", r"\bshow\b", r"\blist\b", r"\bhow much\b", r"\bwhat is\b", r"\bstatus\b",
+]
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{1,2}-\d{1,2}|\d{1,2}月\d{1,2}[日号]")
+
+
+class ModelTier(str, Enum):
+    FAST = "fast"
+    PRO = "pro"
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    tier: ModelTier
+    model: str
+    confidence: float
+    reason: str
+
+
+class ModelRouter:
+    """在快速模型（Haiku）和 Sonnet 之间路由
+
+    用轻量的规则分类器给问题打复杂度分数:
+    - 简单查询、参数提取类问题走快速模型
+    - 多步推理（对比、分析、归因等）走 Sonnet
+    - 分类置信度低于 min_confidence 时升级到 Sonnet
+    """
+
+    def __init__(
+        self,
+        *,
+        fast_model: str = BedrockModel.PLUS_MODEL_ID.value,
+        pro_model: str = BedrockModel.PRO_MODEL_ID.value,
+        min_confidence: float = 0.6,
+        long_query_chars: int = 200,
+    ):
+        """初始化模型路由
+
+        Args:
+            fast_model: 快速模型 ID
+            pro_model: 复杂问题使用的模型 ID
+            min_confidence: 选择快速模型所需的最低置信度
+            long_query_chars: 超过该长度的问题视为复杂问题的信号
+        """
+        self.fast_model = fast_model
+        self.pro_model = pro_model
+        self.min_confidence = min_confidence
+        self.long_query_chars = long_query_chars
+        self._complex = [re.compile(p, re.IGNORECASE) for p in COMPLEX_PATTERNS]
+        self._simple = [re.compile(p, re.IGNORECASE) for p in SIMPLE_PATTERNS]
+
+    def route(self, query: str) -> RoutingDecision:
+        """为一个用户问题选择模型"""
+        complex_hits = [p.pattern for p in self._complex if p.search(query)]
+        simple_hits = [p.pattern for p in self._simple if p.search(query)]
+        dates = len(DATE_PATTERN.findall(query))
+
+        # reason 只列出实际提高了分数的规则
+        score = -0.5 * len(simple_hits)
+        signals = []
+        if complex_hits:
+            score += 1.0 * len(complex_hits)
+            signals.append(f"complex signals: {complex_hits}")
+        if len(query) > self.long_query_chars:
+            score += 1.0
+            signals.append(f"long query: {len(query)} chars")
+        # 超过一组起止日期, 通常是多个时间段的对比
+        if dates > 2:
+            score += 1.0
+            signals.append(f"multiple date ranges: {dates} dates")
+
+        if score > 0:
+            decision = self._decision(ModelTier.PRO, 1.0, "; ".join(signals))
+        else:
+            # 简单信号越多、没有复杂信号时, 越有把握使用快速模型
+            confidence = min(1.0, 0.4 + 0.2 * len(simple_hits) - 0.2 * len(complex_hits))
+            if confidence < self.min_confidence:
+                decision = self._decision(
+                    ModelTier.PRO, confidence, f"escalated, fast tier confidence {confidence:.2f}"
+                )
+            else:
+                decision = self._decision(ModelTier.FAST, confidence, f"simple signals: {simple_hits}")
+
+        metrics.incr(f"model_router.{decision.tier.value}")
+        logger.info(
+            "Model routing: tier=%s model=%s confidence=%.2f reason=%s",
+            decision.tier.value,
+            decision.model,
+            decision.confidence,
+            decision.reason,
+        )
+        return decision
+
+    def _decision(self, tier: ModelTier, confidence: float, reason: str) -> RoutingDecision:
+        model = self.fast_model if tier == ModelTier.FAST else self.pro_model
+        return RoutingDecision(tier=tier, model=model, confidence=confidence, reason=reason)
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Any, Sequence
+
+import litellm
+from langchain_core.messages import BaseMessage
+
+# message id -> token 数, 历史消息每一轮都会重新计算, 缓存避免重复分词
+_MESSAGE_TOKENS: "OrderedDict[str, int]" = OrderedDict()
+_MESSAGE_TOKENS_MAX_SIZE = 10000
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    return litellm.token_counter(text=text)
+
+
+def message_text(message: BaseMessage) -> str:
+    """取出消息中的文本, 兼容 content 为 block 列表的情况"""
+    return content_text(message.content)
+
+
+def content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif isinstance(block, dict) and "text" in block:
+            parts.append(block["text"])
+    return "".join(parts)
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """估算一条消息的 token 数（包括工具调用参数）"""
+    if message.id and message.id in _MESSAGE_TOKENS:
+        _MESSAGE_TOKENS.move_to_end(message.id)
+        return _MESSAGE_TOKENS[message.id]
+
+    text = message_text(message)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        text += tool_call["name"] + str(tool_call["args"])
+    tokens = count_tokens(text)
+
+    if message.id:
+        _MESSAGE_TOKENS[message.id] = tokens
+        if len(_MESSAGE_TOKENS) > _MESSAGE_TOKENS_MAX_SIZE:
+            _MESSAGE_TOKENS.popitem(last=False)
+    return tokens
+
+
+def count_messages_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(count_message_tokens(message) for message in messages)
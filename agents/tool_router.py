@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+from langchain_core.tools import BaseTool
+
+from bedrock_service import BedrockAIService, BedrockModel
+
+logger = logging.getLogger(__name__)
+
+
+class ToolRouter:
+    """根据用户问题选择需要绑定的工具子集, 减少每次调用模型时发送的工具 schema
+
+    - 工具名称和描述的 embedding 预先计算并缓存, 工具集合变化时只补算新工具
+    - 按与问题的相似度选出 top_k 个工具, 再扩展到这些工具所在的整个 MCP server
+    - embedding 失败或最高相似度低于 min_score 时, 回退到全部工具
+    """
+
+    def __init__(
+        self,
+        *,
+        top_k: int = 8,
+        min_score: float = 0.2,
+        embedding_model: str = BedrockModel.EMBEDDING_MODEL_ID_V2.value,
+        query_cache_size: int = 256,
+    ):
+        """初始化工具路由
+
+        Args:
+            top_k: 按相似度选出的工具数量（扩展到同一 server 之前）
+            min_score: 最高相似度低于该值时回退到全部工具
+            embedding_model: Bedrock embedding 模型 ID
+            query_cache_size: 缓存的问题 embedding 数量
+        """
+        self.top_k = top_k
+        self.min_score = min_score
+        self.embedding_model = embedding_model
+        self._tool_vectors: Dict[str, List[float]] = {}
+        self._query_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._index_lock = asyncio.Lock()
+
+    async def aselect(
+        self,
+        query: str,
+        tools: Sequence[BaseTool],
+        groups: Optional[Mapping[str, Iterable[str]]] = None,
+        sticky: Iterable[str] = (),
+    ) -> List[BaseTool]:
+        """选择与问题相关的工具
+
+        Args:
+            query: 用户问题
+            tools: 全部可用工具
+            groups: server 名称 -> 工具名称列表, 选中一个工具时同一 server 的工具一起绑定
+            sticky: 必须保留的工具名称, 例如本会话之前已经绑定过的工具
+
+        Returns:
+            List[BaseTool]: 选中的工具, 保持 tools 中的原始顺序
+        """
+        if len(tools) <= self.top_k or not query.strip():
+            return list(tools)
+
+        try:
+            await self._ensure_index(tools)
+            query_vector = await self._embed_query(query)
+        except Exception as e:
+            logger.warning("Tool routing failed, binding all tools: %s", e)
+            return list(tools)
+
+        scores = {
+            tool.name: _dot(query_vector, self._tool_vectors[_tool_key(tool)])
+            for tool in tools
+        }
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if scores[ranked[0]] < self.min_score:
+            logger.info("Tool routing: best score %.3f below threshold, binding all tools", scores[ranked[0]])
+            return list(tools)
+
+        selected = set(ranked[:self.top_k]) | set(sticky)
+        for names in (groups or {}).values():
+            names = set(names)
+            if names & selected:
+                selected |= names
+
+        result = [tool for tool in tools if tool.name in selected]
+        logger.info(
+            "Tool routing: bound %d/%d tools: %s",
+            len(result),
+            len(tools),
+            ", ".join(tool.name for tool in result),
+        )
+        return result
+
+    async def _ensure_index(self, tools: Sequence[BaseTool]):
+        """为还没有 embedding 的工具计算向量"""
+        missing = {_tool_key(tool): tool for tool in tools if _tool_key(tool) not in self._tool_vectors}
+        if not missing:
+            return
+        async with self._index_lock:
+            missing = {key: tool for key, tool in missing.items() if key not in self._tool_vectors}
+            if not missing:
+                return
+            vectors = await BedrockAIService().aembed(
+                [_tool_document(tool) for tool in missing.values()],
+                model=self.embedding_model,
+            )
+            for key, vector in zip(missing, vectors):
+                self._tool_vectors[key] = _normalize(vector)
+            logger.info("Tool routing index: %d tools embedded", len(missing))
+
+    async def _embed_query(self, query: str) -> List[float]:
+        vector = self._query_vectors.get(query)
+        if vector is None:
+            [vector] = await BedrockAIService().aembed([query], model=self.embedding_model)
+            vector = _normalize(vector)
+            self._query_vectors[query] = vector
+            if len(self._query_vectors) > self._query_cache_size:
+                self._query_vectors.popitem(last=False)
+        else:
+            self._query_vectors.move_to_end(query)
+        return vector
+
+
+def _tool_document(tool: BaseTool) -> str:
+    return f"{tool.name}: {tool.description}"
+
+
+def _tool_key(tool: BaseTool) -> str:
+    return hashlib.sha1(_tool_document(tool).encode("utf-8")).hexdigest()
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
@@ -1,9 +1,12 @@
 import os
 from enum import Enum
+from typing import List, Optional
 
 import litellm
 from langchain_community.chat_models import ChatLiteLLM
 
+from llm_cache import TieredLLMCache
+
 # 确保环境变量被正确加载
 from dotenv import load_dotenv
 load_dotenv()
@@ -38,9 +41,28 @@ class BedrockAIService:
     AWS_REGION_NAME = os.environ.get("AWS_REGION_NAME", "us-west-2")
     AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+    LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "false").lower() == "true"
+
+    _llm_cache: Optional[TieredLLMCache] = None
+
+    def llm_converse(
+        self,
+        model: str,
+        temperature: int = 0,
+        max_tokens: int = 4096,
+        cache: Optional[bool] = None,
+    ):
+        """创建 Bedrock Converse 模型
 
-    def llm_converse(self, model: str, temperature: int = 0, max_tokens: int = 4096):
+        Args:
+            model: Bedrock 模型 ID
+            temperature: 采样温度
+            max_tokens: 最大输出 token 数
+            cache: 是否启用响应缓存, 默认读取 LLM_CACHE_ENABLED; 只在 temperature 为 0 时生效
+        """
         model_id = f"bedrock/converse/{model}"
+        if cache is None:
+            cache = self.LLM_CACHE_ENABLED
         return ChatLiteLLM(
             model=model_id,
             temperature=temperature,
@@ -48,7 +70,39 @@ class BedrockAIService:
             aws_access_key_id=self.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=self.AWS_SECRET_ACCESS_KEY,
             aws_region_name=self.AWS_REGION_NAME,
+            # 非 0 温度的输出本身不确定, 不缓存
+            cache=self.llm_cache() if cache and temperature == 0 else None,
             model_kwargs={
                 # "thinking": {"type": "enabled", "budget_tokens": 1024},
             },
         )
+
+    @classmethod
+    def llm_cache(cls) -> TieredLLMCache:
+        """进程内共享的 LLM 响应缓存, 可通过 stats() 查看命中情况"""
+        if cls._llm_cache is None:
+            cls._llm_cache = TieredLLMCache.from_env()
+        return cls._llm_cache
+
+    async def aembed(
+        self,
+        texts: List[str],
+        model: str = BedrockModel.EMBEDDING_MODEL_ID_V2.value,
+    ) -> List[List[float]]:
+        """获取文本的 embedding 向量
+
+        Args:
+            texts: 需要计算 embedding 的文本列表
+            model: Bedrock embedding 模型 ID
+
+        Returns:
+            List[List[float]]: 与 texts 一一对应的向量
+        """
+        response = await litellm.aembedding(
+            model=f"bedrock/{model}",
+            input=texts,
+            aws_access_key_id=self.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=self.AWS_SECRET_ACCESS_KEY,
+            aws_region_name=self.AWS_REGION_NAME,
+        )
+        return [item["embedding"] for item in response.data]
@@ -1,51 +1,148 @@
 import logging
 import pdb
+import time
 import chainlit as cl
 import os
 from dotenv import load_dotenv
-from typing import Dict, Optional
-from langchain_core.messages import HumanMessage
-from langchain_core.runnables.config import RunnableConfig
-from langgraph.checkpoint.memory import MemorySaver
-from agents.chainlit_agent import create_chainlit_agent
+from typing import Any, Dict, Optional
+from langchain_core.messages import BaseMessage, HumanMessage
+from agents.agent_registry import agent_config
+from agents.checkpointers.bounded_memory_saver import BoundedMemorySaver
+from agents.checkpointers.sqlite_saver import SqliteSaver
+from agents.chainlit_agent import get_chainlit_agent, route_chainlit_model, select_chainlit_tools
 from agents.qdrant_agent import QdrantAgent
+from agents.tokens import content_text
+from metrics import metrics
 
 load_dotenv()
 
+# 是否以 token 流的方式返回 agent 的回答
+STREAMING_ENABLED = os.environ.get("AGENT_STREAMING", "true").lower() == "true"
+
+
+def __create_checkpointer():
+    """根据 CHECKPOINTER_BACKEND 创建进程级共享的 checkpointer
+
+    - sqlite: 持久化到本地 SQLite, 重启或 reload 后会话仍然保留, 可在多个 worker 间共享
+    - memory: 有内存上限的内存 checkpointer, 冷会话写入本地磁盘
+    """
+    backend = os.environ.get("CHECKPOINTER_BACKEND", "sqlite").lower()
+    if backend == "memory":
+        return BoundedMemorySaver.from_env()
+    return SqliteSaver.from_env()
+
+
+CHECKPOINTER = __create_checkpointer()
+
 
 @cl.on_chat_start
 async def on_chat_start():
     current_user = __current_user()
 
-    # 创建共享的 checkpointer
-    checkpointer = MemorySaver()
+    # 使用进程级共享的 checkpointer, 会话之间按 thread_id 区分
     # Store components in session
-    cl.user_session.set("checkpointer", checkpointer)
+    cl.user_session.set("checkpointer", CHECKPOINTER)
 
 @cl.on_message
 async def on_message(message: cl.Message):
     checkpointer = cl.user_session.get("checkpointer")
-    chainlit_agent = create_chainlit_agent(checkpointer=checkpointer)
 
     try:
-        config=RunnableConfig(
-            callbacks=[cl.LangchainCallbackHandler()],
-            configurable={"thread_id": cl.context.session.id},
-            recursion_limit=100,
-        )
-        final_state = await chainlit_agent.ainvoke(
-            {"messages": [HumanMessage(content=message.content)]},
-            config=config
-        )
-        response = final_state["messages"][-1]
-
-        await cl.Message(content=response.content).send()
+        # 只绑定与问题相关的工具; 之前绑定过的工具继续保留, 以便追问和历史中的工具调用
+        bound_tools = cl.user_session.get("bound_tools") or set()
+        tools = await select_chainlit_tools(message.content, sticky=bound_tools)
+        cl.user_session.set("bound_tools", bound_tools | {tool.name for tool in tools})
+        # 简单查询使用快速模型, 多步推理使用 Sonnet
+        decision = route_chainlit_model(message.content)
+        # agent graph 在进程内共享, 会话的 checkpointer 通过 config 传入
+        chainlit_agent = get_chainlit_agent(model=decision.model, tools=tools)
+
+        started_at = time.perf_counter()
+        inputs = {"messages": [HumanMessage(content=message.content)]}
+        if STREAMING_ENABLED:
+            # 工具调用由 __stream_agent 显示为 step, 不再需要 LangchainCallbackHandler
+            config = agent_config(
+                thread_id=cl.context.session.thread_id,
+                checkpointer=checkpointer,
+                recursion_limit=100,
+            )
+            await __stream_agent(chainlit_agent, inputs, config, tier=decision.tier.value)
+        else:
+            config = agent_config(
+                thread_id=cl.context.session.thread_id,
+                checkpointer=checkpointer,
+                callbacks=[cl.LangchainCallbackHandler()],
+                recursion_limit=100,
+            )
+            final_state = await chainlit_agent.ainvoke(inputs, config=config)
+            response = final_state["messages"][-1]
+
+            await cl.Message(content=response.content).send()
+
+        metrics.observe(f"agent.latency.{decision.tier.value}", time.perf_counter() - started_at)
 
     except Exception as e:
         error_msg = f"处理过程中出现错误：{str(e)}"
         await cl.Message(content=error_msg).send()
 
 
+async def __stream_agent(agent, inputs: Dict[str, Any], config, tier: str) -> None:
+    """将 LLM token 实时推送到 cl.Message, 并把每次工具调用显示为 step"""
+    response = cl.Message(content="")
+    tool_steps: Dict[str, cl.Step] = {}
+    started_at = time.perf_counter()
+    first_token = True
+    final_state = None
+
+    async for event in agent.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+
+        if kind == "on_chat_model_stream":
+            token = __chunk_text(event["data"]["chunk"])
+            if not token:
+                continue
+            if first_token:
+                first_token = False
+                ttft = time.perf_counter() - started_at
+                metrics.observe("agent.time_to_first_token", ttft)
+                metrics.observe(f"agent.time_to_first_token.{tier}", ttft)
+            await response.stream_token(token)
+
+        elif kind == "on_tool_start":
+            step = cl.Step(name=event["name"], type="tool")
+            step.input = event["data"].get("input")
+            await step.send()
+            tool_steps[event["run_id"]] = step
+
+        elif kind == "on_tool_end":
+            step = tool_steps.pop(event["run_id"], None)
+            if step is not None:
+                output = event["data"].get("output")
+                step.output = output.content if isinstance(output, BaseMessage) else str(output)
+                await step.update()
+
+        elif kind == "on_tool_error":
+            step = tool_steps.pop(event["run_id"], None)
+            if step is not None:
+                step.is_error = True
+                step.output = str(event["data"].get("error"))
+                await step.update()
+
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            final_state = event["data"].get("output")
+
+    metrics.observe("agent.total_latency", time.perf_counter() - started_at)
+    # 模型没有逐 token 返回时（例如命中缓存）, 使用最终状态中的回答
+    if not response.content and isinstance(final_state, dict) and final_state.get("messages"):
+        response.content = final_state["messages"][-1].content
+    await response.send()
+
+
+def __chunk_text(chunk: Any) -> str:
+    """取出 AIMessageChunk 中的文本, 兼容 content 为 block 列表的情况"""
+    return content_text(getattr(chunk, "content", ""))
+
+
 # google 授权登陆
 @cl.oauth_callback
 def oauth_callback(
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 消息序列化后与内容无关、每次都会变化的字段
+VOLATILE_MESSAGE_FIELDS = {"response_metadata", "usage_metadata"}
+
+
+class TieredLLMCache(BaseCache):
+    """LLM 响应缓存: 内存 LRU + 本地 SQLite, 两层都有 TTL
+
+    key 由模型参数（llm_string）和规范化后的消息列表生成, 去掉消息 id 等每次都会变化的字段。
+    只应用于 temperature 为 0 的模型, 由 BedrockAIService 决定是否启用。
+    """
+
+    def __init__(self, path: str, *, max_items: int = 1000, ttl: float = 24 * 3600):
+        """初始化缓存
+
+        Args:
+            path: 磁盘缓存的 SQLite 文件路径
+            max_items: 内存层最多缓存的条数
+            ttl: 缓存有效期（秒）
+        """
+        self.path = path
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+
+    @classmethod
+    def from_env(cls) -> "TieredLLMCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            os.environ.get("LLM_CACHE_PATH", os.path.join("data", "llm_cache.sqlite")),
+            max_items=int(os.environ.get("LLM_CACHE_MAX_ITEMS", "1000")),
+            ttl=float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(24 * 3600))),
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                metrics.incr("llm_cache.hit.memory")
+                return entry[1]
+
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is not None:
+            try:
+                generations = [loads(item) for item in json.loads(row[0])]
+            except Exception as e:
+                logger.warning("Failed to load cached LLM response: %s", e)
+            else:
+                self._remember(key, row[1], generations)
+                self.hits_disk += 1
+                metrics.incr("llm_cache.hit.disk")
+                return generations
+
+        self.misses += 1
+        metrics.incr("llm_cache.miss")
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, return_val)
+        try:
+            value = json.dumps([dumps(generation) for generation in return_val])
+        except Exception as e:
+            logger.warning("LLM response is not serializable, only cached in memory: %s", e)
+            return
+        self._connection().execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+        self._connection().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中和未命中计数"""
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def _remember(self, key: str, expires_at: float, value: RETURN_VAL_TYPE):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接（alookup/aupdate 在线程池中执行）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """根据模型参数和规范化后的消息列表生成缓存 key"""
+    try:
+        normalized = json.dumps(_normalize(json.loads(prompt)), sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        normalized = prompt
+    return hashlib.sha256(f"{llm_string}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    """去掉消息 id、工具调用 id 和响应元数据; 序列化格式中表示类路径的 id 是列表, 保留"""
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: _normalize(item)
+            for key, item in value.items()
+            if not _is_volatile(key, item)
+        }
+    return value
+
+
+def _is_volatile(key: str, value: Any) -> bool:
+    if key in ("id", "tool_call_id"):
+        return not isinstance(value, list)
+    return key in VOLATILE_MESSAGE_FIELDS
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 
 from fastapi import FastAPI
 from langchain_mcp_adapters.client import MultiServerMCPClient
@@ -25,6 +25,19 @@ def get_mcp_tools():
     return _app.state.mcp_tools
 
 
+def get_mcp_tool_groups() -> Dict[str, List[str]]:
+    """
+    Get MCP tool names grouped by server name.
+    """
+    if _app is None:
+        raise ValueError("FastAPI App reference not initialized")
+    server_name_to_tools = getattr(_app.state.mcp_client, "server_name_to_tools", {})
+    return {
+        server_name: [tool.name for tool in tools]
+        for server_name, tools in server_name_to_tools.items()
+    }
+
+
 def create_mcp_client():
     """
     Create an MCP client for the application.
@@ -76,6 +89,7 @@ def create_mcp_client():
                 "env": {
                     **default_env,
                     "TEXTNOW_JAMPP_API_CLIENT_SECRET": os.environ.get("TEXTNOW_JAMPP_API_CLIENT_SECRET", ""),
+                    "MCP_RESULT_FORMAT": os.environ.get("MCP_RESULT_FORMAT", "rows"),
                 },
             },
             "iron_source": {
@@ -91,6 +105,7 @@ def create_mcp_client():
                     **default_env,
                     "IRON_SOURCE_SECRET_KEY": os.environ.get("IRON_SOURCE_SECRET_KEY", ""),
                     "IRON_SOURCE_REFRESH_KEY": os.environ.get("IRON_SOURCE_REFRESH_KEY", ""),
+                    "MCP_RESULT_FORMAT": os.environ.get("MCP_RESULT_FORMAT", "rows"),
                 },
             },
             "inmobi": {
@@ -120,6 +135,7 @@ def create_mcp_client():
             #     "env": {
             #         **default_env,
             #         "DATABASE_URL": os.environ.get("POSTGRES_DATABASE", ""),
+            #         "MCP_RESULT_FORMAT": os.environ.get("MCP_RESULT_FORMAT", "rows"),
             #     },
             # },
             "math": {
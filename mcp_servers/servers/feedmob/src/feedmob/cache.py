@@ -0,0 +1,107 @@
+"""In-process TTL cache for dimension lookups (clients, campaigns, vendors)."""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from cachetools import TTLCache
+
+T = TypeVar("T")
+
+
+class DimensionCache:
+    """Thread-safe TTL + size bounded cache with hit/miss counters.
+
+    Keys are tuples whose first element is the lookup name, so one lookup can
+    be invalidated without dropping the others.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        """Create the cache.
+
+        Args:
+            maxsize: Maximum number of cached results
+            ttl: Seconds a cached result stays valid
+        """
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "DimensionCache":
+        """Create the cache from FEEDMOB_CACHE_MAX_SIZE and FEEDMOB_CACHE_TTL."""
+        return cls(
+            maxsize=int(os.getenv("FEEDMOB_CACHE_MAX_SIZE", "1024")),
+            ttl=float(os.getenv("FEEDMOB_CACHE_TTL", "3600")),
+        )
+
+    def get(self, key: Tuple[Hashable, ...]) -> Tuple[bool, Any]:
+        """Look up a key, counting the hit or miss against its lookup name.
+
+        Returns:
+            Tuple[bool, Any]: (found, value)
+        """
+        name = key[0]
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                self._misses[name] = self._misses.get(name, 0) + 1
+                return False, None
+            self._hits[name] = self._hits.get(name, 0) + 1
+            return True, value
+
+    def set(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    async def get_or_load(self, key: Tuple[Hashable, ...], load: Callable[[], Any]) -> Any:
+        """Return the cached value for key, awaiting load() and caching its result on a miss."""
+        found, value = self.get(key)
+        if found:
+            return value
+        value = await load()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, name: Optional[str] = None) -> int:
+        """Drop cached results of one lookup, or of all lookups when name is None.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            if name is None:
+                removed = len(self._cache)
+                self._cache.clear()
+                return removed
+            keys = [key for key in self._cache.keys() if key[0] == name]
+            for key in keys:
+                self._cache.pop(key, None)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rates per lookup name and current cache size."""
+        with self._lock:
+            lookups = {}
+            for name in sorted(set(self._hits) | set(self._misses)):
+                hits, misses = self._hits.get(name, 0), self._misses.get(name, 0)
+                lookups[name] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl": self._cache.ttl,
+                "lookups": lookups,
+            }
+
+
+def normalize_name(name: str) -> str:
+    """Collapse whitespace so equivalent spellings share a cache entry."""
+    return " ".join(name.split())
+
+
+dimension_cache = DimensionCache.from_env()
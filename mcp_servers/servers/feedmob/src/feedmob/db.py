@@ -1,19 +1,328 @@
 """Database connection and query functionality."""
+import asyncio
+import base64
+import contextvars
+import functools
+import json
 import os
-from typing import Any, Dict, List
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.elements import TextClause
 from dotenv import load_dotenv
 
+from .stats import TimingStats
+
 load_dotenv()
 
+T = TypeVar("T")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "60"))
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+# One worker per pooled connection, so queries never queue on the pool inside a thread
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW, thread_name_prefix="feedmob-db")
+
+
+class _DbCall:
+    """Tracks the DBAPI connection used by one offloaded call so it can be cancelled."""
+
+    def __init__(self):
+        self.dbapi_connection = None
+
+
+_current_call: contextvars.ContextVar[Optional[_DbCall]] = contextvars.ContextVar("feedmob_db_call", default=None)
+
+checkout_timings = TimingStats()
+query_timings = TimingStats()
+
+CLIENT_INFOS_QUERY = text("""
+    SELECT clients.*
+    FROM clients
+    WHERE name ilike :client_name
+""")
+
+CLIENT_INFOS_BATCH_QUERY = text("""
+    SELECT p.client_name as query_name, clients.*
+    FROM unnest(CAST(:client_names AS text[])) AS p(client_name)
+    JOIN clients ON clients.name ilike p.client_name
+""")
+
+CLIENT_NAMES_QUERY = text("SELECT clients.* FROM clients")
+
+VENDOR_NAMES_QUERY = text("SELECT id, vendor_name as name FROM vendors")
+
+JAMPP_CAMPAIGN_MAPPINGS_QUERY = text("""
+    SELECT jcm.*, campaigns.name as campaign_name, c.name as client_name, v.vendor_name as vendor_name
+    FROM jampp_campaign_mappings jcm
+    JOIN campaigns  ON campaigns.id = jcm.campaign_id
+    JOIN clients c ON campaigns.client_id = c.id
+    JOIN vendors v ON jcm.vendor_id = v.id
+    WHERE c.name ilike :client_name
+    AND v.vendor_name = :vendor_name
+""")
+
+NET_SPENDS_FROM = """
+    FROM net_spends ns
+    JOIN campaigns camp ON ns.campaign_id = camp.id
+    JOIN clients c ON camp.client_id = c.id
+    JOIN vendors v ON ns.vendor_id = v.id
+    WHERE c.name ilike :client_name
+    AND v.vendor_name = :vendor_name
+    AND ns.spend_date BETWEEN :start_date AND :end_date
+"""
+
+NET_SPENDS_COLUMNS = """
+    SELECT ns.gross_spend_cents/100.0 as gross_spend, ns.net_spend_cents/100.0 as net_spend,
+    ns.spend_date, ns.click_url_id as click_url_id, ns.campaign_id as campaign_id, camp.name as campaign_name,
+    c.name as client_name, v.vendor_name as vendor_name, ns.id as net_spend_id
+"""
+
+NET_SPENDS_TOTALS_QUERY = text("""
+    SELECT SUM(ns.gross_spend_cents)/100.0 as gross_spend, SUM(ns.net_spend_cents)/100.0 as net_spend,
+    COUNT(*) as row_count
+""" + NET_SPENDS_FROM)
+
+# Client / vendor pairs are passed as two parallel arrays and joined as a set, 1-based pair_index keeps them apart
+NET_SPENDS_BATCH_FROM = """
+    FROM unnest(CAST(:client_names AS text[]), CAST(:vendor_names AS text[]))
+         WITH ORDINALITY AS p(client_name, vendor_name, pair_index)
+    JOIN clients c ON c.name ilike p.client_name
+    JOIN campaigns camp ON camp.client_id = c.id
+    JOIN net_spends ns ON ns.campaign_id = camp.id
+    JOIN vendors v ON ns.vendor_id = v.id AND v.vendor_name = p.vendor_name
+    WHERE ns.spend_date BETWEEN :start_date AND :end_date
+"""
+
+# group_by name -> (SQL expression, output column, SQL type used to cast cursor values)
+NET_SPENDS_GROUPS = {
+    "day": ("ns.spend_date", "spend_date", "date"),
+    "campaign": ("ns.campaign_id", "campaign_id", "bigint"),
+    # Rows without a click url are grouped under 0 so keyset comparisons never see NULL
+    "click_url": ("COALESCE(ns.click_url_id, 0)", "click_url_id", "bigint"),
+}
+
+# Keyset used to page through ungrouped rows
+NET_SPENDS_ROW_KEYS = (
+    ("ns.spend_date", "spend_date", "date"),
+    ("ns.id", "net_spend_id", "bigint"),
+)
+
+DIRECT_SPEND_JOB_STATS_QUERY = text("""
+    SELECT dsjs.*
+    FROM direct_spend_job_stats dsjs
+    WHERE deleted_at IS NULL
+""")
+
+# Includes soft-deleted rows, so an incremental refresh can drop them
+DIRECT_SPEND_JOB_STATS_CHANGES_QUERY = text("""
+    SELECT dsjs.*
+    FROM direct_spend_job_stats dsjs
+    WHERE updated_at >= :since
+    ORDER BY updated_at
+""")
+
+
 def get_db_engine() -> Engine:
-    """Create and return a database engine."""
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        raise ValueError("DATABASE_URL environment variable is not set")
+    """Return the process-wide database engine, creating it on first use.
+
+    Pool settings can be tuned with environment variables:
+        DB_POOL_SIZE (default 5), DB_MAX_OVERFLOW (default 5),
+        DB_POOL_TIMEOUT seconds (default 30), DB_POOL_RECYCLE seconds (default 1800)
+
+    DB_QUERY_TIMEOUT (default 60 seconds) is also applied as the Postgres
+    statement_timeout, so abandoned queries are stopped server-side.
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+
+    with _engine_lock:
+        if _engine is None:
+            db_url = os.getenv("DATABASE_URL")
+            if not db_url:
+                raise ValueError("DATABASE_URL environment variable is not set")
+
+            _engine = create_engine(
+                db_url,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+                pool_pre_ping=True,
+                connect_args={"options": f"-c statement_timeout={int(DB_QUERY_TIMEOUT * 1000)}"},
+            )
+            _register_query_timing(_engine)
+    return _engine
+
+
+@contextmanager
+def db_connection() -> Iterator[Connection]:
+    """Check out a pooled connection, recording how long the checkout took."""
+    engine = get_db_engine()
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        checkout_timings.record(time.perf_counter() - started)
+        call = _current_call.get()
+        if call is not None:
+            call.dbapi_connection = conn.connection.dbapi_connection
+        try:
+            yield conn
+        finally:
+            if call is not None:
+                call.dbapi_connection = None
+
+
+async def run_db(func: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+    """Run a blocking query function on the bounded DB thread pool.
+
+    Several calls can be in flight at once, up to the pool size. When the call
+    times out or the awaiting task is cancelled, the running Postgres query is
+    cancelled as well.
+
+    Args:
+        func: Blocking query function, e.g. get_db_client_infos
+        timeout: Seconds to wait, defaults to DB_QUERY_TIMEOUT
+
+    Raises:
+        TimeoutError: If the query does not finish in time
+    """
+    call = _DbCall()
+    context = contextvars.copy_context()
+    context.run(_current_call.set, call)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout or DB_QUERY_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if call.dbapi_connection is not None:
+            call.dbapi_connection.cancel()
+        raise
+
+
+def get_db_stats() -> Dict[str, Any]:
+    """Get connection pool status and checkout/query timings."""
+    stats: Dict[str, Any] = {
+        "executor_workers": DB_POOL_SIZE + DB_MAX_OVERFLOW,
+        "checkout": checkout_timings.snapshot(),
+        "query": query_timings.snapshot(),
+    }
+    if _engine is not None:
+        pool = _engine.pool
+        stats["pool"] = {
+            "status": pool.status(),
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+    return stats
+
+
+def _register_query_timing(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        query_timings.record(time.perf_counter() - conn.info["query_started"].pop())
+
+
+@lru_cache(maxsize=None)
+def _net_spends_query(group_by: Tuple[str, ...], paged: bool, after: bool) -> TextClause:
+    """Build the net spends statement once per group_by / pagination combination.
+
+    Rows are ordered by their keyset, so a page continues strictly after the
+    keys of the last row of the previous page.
+    """
+    keys = net_spends_keys(group_by)
+    if group_by:
+        columns = [f"{expr} as {name}" for expr, name, _ in keys]
+        if "campaign" in group_by:
+            columns.append("MAX(camp.name) as campaign_name")
+        columns += [
+            "SUM(ns.gross_spend_cents)/100.0 as gross_spend",
+            "SUM(ns.net_spend_cents)/100.0 as net_spend",
+            "COUNT(*) as row_count",
+        ]
+        query = "SELECT " + ", ".join(columns) + NET_SPENDS_FROM
+    else:
+        query = NET_SPENDS_COLUMNS + NET_SPENDS_FROM
+
+    if after:
+        left = ", ".join(expr for expr, _, _ in keys)
+        right = ", ".join(f"CAST(:after_{i} AS {sql_type})" for i, (_, _, sql_type) in enumerate(keys))
+        query += f" AND ({left}) > ({right})"
+    if group_by:
+        query += " GROUP BY " + ", ".join(expr for expr, _, _ in keys)
+    query += " ORDER BY " + ", ".join(expr for expr, _, _ in keys)
+    if paged:
+        query += " LIMIT :limit"
+    return text(query)
+
+
+@lru_cache(maxsize=None)
+def _net_spends_batch_query(group_by: Tuple[str, ...]) -> TextClause:
+    """Build the batch statement once per group_by; no group_by sums each pair's whole range."""
+    keys = [("p.pair_index", "pair_index", "bigint")] + (list(net_spends_keys(group_by)) if group_by else [])
+    columns = [f"{expr} as {name}" for expr, name, _ in keys]
+    if "campaign" in group_by:
+        columns.append("MAX(camp.name) as campaign_name")
+    columns += [
+        "SUM(ns.gross_spend_cents)/100.0 as gross_spend",
+        "SUM(ns.net_spend_cents)/100.0 as net_spend",
+        "COUNT(*) as row_count",
+    ]
+    group = ", ".join(expr for expr, _, _ in keys)
+    return text("SELECT " + ", ".join(columns) + NET_SPENDS_BATCH_FROM + f" GROUP BY {group} ORDER BY {group}")
+
+
+def net_spends_keys(group_by: Sequence[str]) -> Tuple[Tuple[str, str, str], ...]:
+    """Keyset columns for a group_by: the group columns, or spend_date and id for raw rows.
+
+    Raises:
+        ValueError: If group_by contains an unknown dimension
+    """
+    unknown = [name for name in group_by if name not in NET_SPENDS_GROUPS]
+    if unknown:
+        raise ValueError(f"Unsupported group_by: {', '.join(unknown)}. Use {', '.join(NET_SPENDS_GROUPS)}")
+    if not group_by:
+        return NET_SPENDS_ROW_KEYS
+    return tuple(NET_SPENDS_GROUPS[name] for name in group_by)
+
+
+def encode_net_spends_cursor(row: Dict[str, Any], group_by: Sequence[str]) -> str:
+    """Encode the keyset of the last row of a page as an opaque cursor."""
+    values = [row[name] for _, name, _ in net_spends_keys(group_by)]
+    payload = {"g": list(group_by), "k": [v.isoformat() if isinstance(v, date) else v for v in values]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_net_spends_cursor(cursor: str, group_by: Sequence[str]) -> List[Any]:
+    """Decode a cursor produced by encode_net_spends_cursor for the same group_by.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for a different group_by
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        group, values = payload["g"], payload["k"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if group != list(group_by) or len(values) != len(net_spends_keys(group_by)):
+        raise ValueError("Cursor does not match group_by, start again without a cursor")
+    return values
 
-    return create_engine(db_url)
 
 def get_db_client_infos(client_name: str) -> List[Dict[str, Any]]:
     """Get client information from the database.
@@ -29,20 +338,40 @@ def get_db_client_infos(client_name: str) -> List[Dict[str, Any]]:
             - updated_at: Last update timestamp
             - other client-specific fields
     """
-    engine = get_db_engine()
-    query = text("""
-        SELECT clients.*
-        FROM clients
-        WHERE name ilike :client_name
-    """)
-
-    with engine.connect() as conn:
+    with db_connection() as conn:
         result = conn.execute(
-            query,
+            CLIENT_INFOS_QUERY,
             {"client_name": client_name}
         )
         return [row._mapping for row in result]
 
+def get_db_client_infos_batch(client_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Get client information for several names in one query.
+
+    Args:
+        client_names (List[str]): Names of the clients to search for
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Client records keyed by the searched name
+    """
+    clients: Dict[str, List[Dict[str, Any]]] = {name: [] for name in client_names}
+    with db_connection() as conn:
+        result = conn.execute(CLIENT_INFOS_BATCH_QUERY, {"client_names": list(client_names)})
+        for row in result:
+            record = dict(row._mapping)
+            clients[record.pop("query_name")].append(record)
+    return clients
+
+def get_db_client_names() -> List[Dict[str, Any]]:
+    """Get every client record, used to build the name index that answers client lookups."""
+    with db_connection() as conn:
+        return [dict(row._mapping) for row in conn.execute(CLIENT_NAMES_QUERY)]
+
+def get_db_vendor_names() -> List[Dict[str, Any]]:
+    """Get id and vendor_name (as name) of every vendor, used to build the fuzzy name index."""
+    with db_connection() as conn:
+        return [dict(row._mapping) for row in conn.execute(VENDOR_NAMES_QUERY)]
+
 def get_db_jampp_campaign_mappings(client_name: str, vendor_name: str) -> List[Dict[str, Any]]:
     """Get campaign mappings for a specific client and vendor.
 
@@ -53,82 +382,40 @@ def get_db_jampp_campaign_mappings(client_name: str, vendor_name: str) -> List[D
     Returns:
         List[Dict[str, Any]]: List of campaign mappings
     """
-    engine = get_db_engine()
-
-    query = text("""
-        SELECT jcm.*, campaigns.name as campaign_name, c.name as client_name, v.vendor_name as vendor_name
-        FROM jampp_campaign_mappings jcm
-        JOIN campaigns  ON campaigns.id = jcm.campaign_id
-        JOIN clients c ON campaigns.client_id = c.id
-        JOIN vendors v ON jcm.vendor_id = v.id
-        WHERE c.name ilike :client_name
-        AND v.vendor_name = :vendor_name
-    """)
-
-    with engine.connect() as conn:
+    with db_connection() as conn:
         result = conn.execute(
-            query,
+            JAMPP_CAMPAIGN_MAPPINGS_QUERY,
             {"client_name": client_name, "vendor_name": vendor_name}
         )
         return [row._mapping for row in result]
 
-def get_db_direct_spend_job_stats(
-    client_ids: List[int] = None,
-    vendor_ids: List[int] = None,
-    click_url_ids: List[int] = None,
-    job: str = None
-) -> List[Dict[str, Any]]:
+def get_db_direct_spend_job_stats(since: Optional[datetime] = None) -> List[Dict[str, Any]]:
     """Get direct spend job stats from the database.
 
     Args:
-        client_ids (List[int], optional): List of client IDs to filter by
-        vendor_ids (List[int], optional): List of vendor IDs to filter by
-        click_url_ids (List[int], optional): List of click URL IDs to filter by
-        job (str, optional): Job name to filter by
+        since (datetime, optional): Only rows updated at or after this time, including
+            soft-deleted ones; all live rows when omitted
 
     Returns:
         List[Dict[str, Any]]: List of direct spend job stats records
     """
-    engine = get_db_engine()
-    conditions = []
-    params: Dict[str, Any] = {}
-
-    query = text("""
-        SELECT dsjs.*,
-               array_to_string(dsjs.pm_users, ',') as pm_users_str,
-               array_to_string(dsjs.pa_users, ',') as pa_users_str,
-               array_to_string(dsjs.click_url_ids, ',') as click_url_ids_str,
-               array_to_string(dsjs.client_ids, ',') as client_ids_str,
-               array_to_string(dsjs.vendor_ids, ',') as vendor_ids_str
-        FROM direct_spend_job_stats dsjs
-        WHERE deleted_at IS NULL
-    """)
-
-    if client_ids:
-        conditions.append("dsjs.client_ids && :client_ids")
-        params["client_ids"] = client_ids
-
-    if vendor_ids:
-        conditions.append("dsjs.vendor_ids && :vendor_ids")
-        params["vendor_ids"] = vendor_ids
-
-    if click_url_ids:
-        conditions.append("dsjs.click_url_ids && :click_url_ids")
-        params["click_url_ids"] = click_url_ids
-
-    if job:
-        conditions.append("dsjs.job = :job")
-        params["job"] = job
-
-    if conditions:
-        query = text(str(query) + " AND " + " AND ".join(conditions))
-
-    with engine.connect() as conn:
-        result = conn.execute(query, params)
+    with db_connection() as conn:
+        if since is None:
+            result = conn.execute(DIRECT_SPEND_JOB_STATS_QUERY)
+        else:
+            result = conn.execute(DIRECT_SPEND_JOB_STATS_CHANGES_QUERY, {"since": since})
         return [dict(row._mapping) for row in result.fetchall()]
 
 
-def get_db_net_spends(client_name: str, vendor_name: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+def get_db_net_spends(
+    client_name: str,
+    vendor_name: str,
+    start_date: str,
+    end_date: str,
+    group_by: Sequence[str] = (),
+    limit: Optional[int] = None,
+    after: Optional[Sequence[Any]] = None,
+) -> List[Dict[str, Any]]:
     """Get net spends for a client and vendor between dates.
 
     Args:
@@ -136,29 +423,42 @@ def get_db_net_spends(client_name: str, vendor_name: str, start_date: str, end_d
         vendor_name (str): Name of the vendor
         start_date (str): Start date in ISO format
         end_date (str): End date in ISO format
+        group_by (Sequence[str], optional): Dimensions to sum over ("day", "campaign", "click_url");
+            empty returns one record per net spend row
+        limit (int, optional): Maximum number of records to return
+        after (Sequence[Any], optional): Keyset values of the last record already returned,
+            see decode_net_spends_cursor
 
     Returns:
-        List[Dict[str, Any]]: List of net spend records
+        List[Dict[str, Any]]: List of net spend records ordered by their keyset
     """
-    engine = get_db_engine()
+    group_by = tuple(group_by)
+    params: Dict[str, Any] = {
+        "client_name": client_name,
+        "vendor_name": vendor_name,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    if limit is not None:
+        params["limit"] = limit
+    if after:
+        params.update({f"after_{i}": value for i, value in enumerate(after)})
 
-    query = text("""
-        SELECT ns.gross_spend_cents/100.0 as gross_spend, ns.net_spend_cents/100.0 as net_spend,
-        ns.spend_date, ns.click_url_id as click_url_id, ns.campaign_id as campaign_id, camp.name as campaign_name,
-        c.name as client_name, v.vendor_name as vendor_name
-        FROM net_spends ns
-        JOIN campaigns camp ON ns.campaign_id = camp.id
-        JOIN clients c ON camp.client_id = c.id
-        JOIN vendors v ON ns.vendor_id = v.id
-        WHERE c.name ilike :client_name
-        AND v.vendor_name = :vendor_name
-        AND ns.spend_date BETWEEN :start_date AND :end_date
-        ORDER BY ns.spend_date
-    """)
+    query = _net_spends_query(group_by, limit is not None, bool(after))
+    with db_connection() as conn:
+        result = conn.execute(query, params)
+        return [dict(row._mapping) for row in result.fetchall()]
 
-    with engine.connect() as conn:
+
+def get_db_net_spend_totals(client_name: str, vendor_name: str, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Sum net spends for a client and vendor between dates.
+
+    Returns:
+        Dict[str, Any]: gross_spend, net_spend and row_count over the whole date range
+    """
+    with db_connection() as conn:
         result = conn.execute(
-            query,
+            NET_SPENDS_TOTALS_QUERY,
             {
                 "client_name": client_name,
                 "vendor_name": vendor_name,
@@ -166,4 +466,36 @@ def get_db_net_spends(client_name: str, vendor_name: str, start_date: str, end_d
                 "end_date": end_date
             }
         )
+        return dict(result.one()._mapping)
+
+
+def get_db_net_spends_batch(
+    pairs: Sequence[Tuple[str, str]],
+    start_date: str,
+    end_date: str,
+    group_by: Sequence[str] = (),
+) -> List[Dict[str, Any]]:
+    """Sum net spends for several client / vendor pairs in one set-based query.
+
+    Args:
+        pairs (Sequence[Tuple[str, str]]): (client_name, vendor_name) pairs
+        start_date (str): Start date in ISO format
+        end_date (str): End date in ISO format
+        group_by (Sequence[str], optional): Dimensions to sum over ("day", "campaign", "click_url");
+            empty returns one total per pair
+
+    Returns:
+        List[Dict[str, Any]]: Summed records with the 1-based pair_index of their pair,
+            pairs without spend have no records
+    """
+    with db_connection() as conn:
+        result = conn.execute(
+            _net_spends_batch_query(tuple(group_by)),
+            {
+                "client_names": [client_name for client_name, _ in pairs],
+                "vendor_names": [vendor_name for _, vendor_name in pairs],
+                "start_date": start_date,
+                "end_date": end_date
+            }
+        )
         return [dict(row._mapping) for row in result.fetchall()]
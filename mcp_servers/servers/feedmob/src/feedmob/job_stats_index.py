@@ -0,0 +1,160 @@
+"""In-memory inverted index over direct_spend_job_stats."""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Array columns matched by overlap, like Postgres `&&`
+ARRAY_FIELDS = ("client_ids", "vendor_ids", "click_url_ids")
+
+JobStatsLoader = Callable[[Optional[datetime]], Awaitable[List[Dict[str, Any]]]]
+
+
+class JobStatsIndex:
+    """Live direct_spend_job_stats rows indexed by client, vendor and click url id and by job.
+
+    The table is small and read-mostly: it is loaded once, then refreshed
+    with the rows whose updated_at moved since the last refresh (soft-deleted
+    rows are dropped). A periodic full reload also catches hard deletes.
+    """
+
+    def __init__(self, load: JobStatsLoader, refresh_interval: float = 60, full_reload_interval: float = 3600):
+        """Create the index.
+
+        Args:
+            load: Coroutine returning live rows when called with None, or rows updated since a time
+            refresh_interval: Seconds between incremental refreshes
+            full_reload_interval: Seconds between full reloads
+        """
+        self._load = load
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[Any, Set[Any]]] = {}
+        self._high_water: Optional[datetime] = None
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, load: JobStatsLoader) -> "JobStatsIndex":
+        """Create the index from FEEDMOB_JOB_STATS_REFRESH (default 60) and FEEDMOB_JOB_STATS_FULL_RELOAD (default 3600)."""
+        return cls(
+            load,
+            refresh_interval=float(os.getenv("FEEDMOB_JOB_STATS_REFRESH", "60")),
+            full_reload_interval=float(os.getenv("FEEDMOB_JOB_STATS_FULL_RELOAD", "3600")),
+        )
+
+    async def refresh(self, full: bool = False) -> None:
+        """Apply rows changed since the last refresh, or reload everything."""
+        async with self._lock:
+            await self._refresh(full or not self._loaded_at)
+
+    async def ensure_loaded(self) -> None:
+        """Load the index unless it already has been, e.g. before the refresh loop's first run completes."""
+        if self._loaded_at:
+            return
+        async with self._lock:
+            if not self._loaded_at:
+                await self._refresh(True)
+
+    async def _refresh(self, full: bool) -> None:
+        started = time.perf_counter()
+        if full:
+            rows = await self._load(None)
+            self._rows = {}
+            self._high_water = None
+            self._apply(rows)
+            self._loaded_at = time.monotonic()
+        else:
+            # >= re-applies rows sharing the last timestamp, so none committed with it are missed
+            rows = await self._load(self._high_water)
+            self._apply(rows)
+        self._refreshed_at = time.monotonic()
+        logger.info(
+            "Job stats index %s: %d rows applied, %d live rows in %.3fs",
+            "reloaded" if full else "refreshed",
+            len(rows),
+            len(self._rows),
+            time.perf_counter() - started,
+        )
+
+    async def run_refresh_loop(self) -> None:
+        """Preload the index and keep it fresh; failures keep the current rows."""
+        while True:
+            full = time.monotonic() - self._loaded_at >= self.full_reload_interval
+            try:
+                await self.refresh(full=full)
+            except Exception as e:
+                logger.warning("Job stats index refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def lookup(
+        self,
+        client_ids: Optional[Iterable[int]] = None,
+        vendor_ids: Optional[Iterable[int]] = None,
+        click_url_ids: Optional[Iterable[int]] = None,
+        job: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rows overlapping every given id list and matching job, ordered by id.
+
+        Loads the index first if the refresh loop has not done so yet.
+        """
+        await self.ensure_loaded()
+
+        filters = {
+            "client_ids": client_ids,
+            "vendor_ids": vendor_ids,
+            "click_url_ids": click_url_ids,
+            "job": [job] if job else None,
+        }
+        matched: Optional[Set[Any]] = None
+        for field, values in filters.items():
+            if not values:
+                continue
+            postings = self._postings.get(field, {})
+            ids: Set[Any] = set()
+            for value in values:
+                ids |= postings.get(value, set())
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return []
+        if matched is None:
+            matched = set(self._rows)
+        return [self._rows[row_id] for row_id in sorted(matched)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self._rows),
+            "high_water": self._high_water.isoformat() if self._high_water else None,
+            "age_seconds": round(time.monotonic() - self._refreshed_at, 1) if self._refreshed_at else None,
+            "refresh_interval": self.refresh_interval,
+            "full_reload_interval": self.full_reload_interval,
+        }
+
+    def _apply(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._rows.pop(row["id"], None)
+            if row.get("deleted_at") is None:
+                self._rows[row["id"]] = row
+            updated_at = row.get("updated_at")
+            if updated_at is not None and (self._high_water is None or updated_at > self._high_water):
+                self._high_water = updated_at
+        self._postings = _build_postings(self._rows.values())
+
+
+def _build_postings(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[Any, Set[Any]]]:
+    """Rebuild the inverted index; cheap for a small table and keeps removal logic trivial."""
+    postings: Dict[str, Dict[Any, Set[Any]]] = {field: defaultdict(set) for field in ARRAY_FIELDS + ("job",)}
+    for row in rows:
+        for field in ARRAY_FIELDS:
+            for value in row.get(field) or ():
+                postings[field][value].add(row["id"])
+        if row.get("job"):
+            postings["job"][row["job"]].add(row["id"])
+    return postings
@@ -0,0 +1,206 @@
+"""In-memory trigram index of client and vendor names for fuzzy name resolution."""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W_]+")
+
+NameLoader = Callable[[], Awaitable[Sequence[Dict[str, Any]]]]
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """pg_trgm style trigrams: lowercase words padded with two leading and one trailing space."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+class _Snapshot:
+    """Immutable index over one load of names; replaced as a whole on refresh."""
+
+    def __init__(self, rows: Sequence[Dict[str, Any]], canonical: Iterable[str] = ()):
+        rows = [row for row in rows if row.get("name")]
+        self.rows = [(row["id"], row["name"]) for row in rows]
+        self.records = {row["id"]: row for row in rows}
+        self.by_name: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            self.by_name[row["name"].casefold()].append(row)
+        self.normalized = [normalize(name) for _, name in self.rows]
+        canonical = {normalize(name) for name in canonical}
+        self.canonical = [name in canonical for name in self.normalized]
+        self.grams = [trigrams(name) for _, name in self.rows]
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for position, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def search(self, query: str, limit: int, min_score: float) -> List[Dict[str, Any]]:
+        """Names ranked by trigram similarity, boosting names containing the query.
+
+        Names containing the query score by where it matches, whatever their
+        length: whole leading words 0.9, whole later words 0.85, the prefix of
+        the first word 0.75 and of a later word 0.7. Canonical names come first
+        among equal scores:
+
+        >>> rows = [{"id": 1, "name": "Uberall Inc"}, {"id": 2, "name": "Uber Eats"}, {"id": 3, "name": "Uber Technologies"}]
+        >>> snapshot = _Snapshot(rows, canonical=["Uber Technologies"])
+        >>> [(match["name"], match["score"]) for match in snapshot.search("uber", limit=3, min_score=0.2)]
+        [('Uber Technologies', 0.9), ('Uber Eats', 0.9), ('Uberall Inc', 0.75)]
+        """
+        query_grams = trigrams(query)
+        query_normalized = normalize(query)
+        if not query_grams:
+            return []
+        whole_word = re.compile(rf"\b{re.escape(query_normalized)}\b")
+        word_prefix = re.compile(rf"\b{re.escape(query_normalized)}")
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+
+        ranked: List[Tuple[float, int]] = []
+        for position, common in shared.items():
+            score = common / (len(query_grams) + len(self.grams[position]) - common)
+            name = self.normalized[position]
+            if name == query_normalized:
+                score = 1.0
+            elif whole_word.search(name):
+                # "uber" in "Uber Technologies": always above partial-word prefixes
+                score = max(score, 0.9 if name.startswith(query_normalized) else 0.85)
+            elif word_prefix.search(name):
+                # "uber" in "Uberall Inc": above names that merely share trigrams
+                score = max(score, 0.75 if name.startswith(query_normalized) else 0.7)
+            if score >= min_score:
+                ranked.append((score, position))
+
+        ranked.sort(key=lambda item: (-item[0], not self.canonical[item[1]], self.rows[item[1]][1]))
+        return [
+            {"id": self.rows[position][0], "name": self.rows[position][1], "score": round(score, 4)}
+            for score, position in ranked[:limit]
+        ]
+
+
+class NameIndex:
+    """Periodically refreshed fuzzy index of client and vendor names.
+
+    Rows are loaded in full (they are small dimension tables) and searched
+    by trigram similarity, so resolving a misspelled name, or finding the
+    row of an exact name, takes no database round trip.
+    """
+
+    def __init__(
+        self,
+        loaders: Dict[str, NameLoader],
+        refresh_interval: float = 600,
+        canonical: Optional[Dict[str, Sequence[str]]] = None,
+    ):
+        """Create the index.
+
+        Args:
+            loaders: Kind ("client", "vendor") -> coroutine returning rows with id and name
+            refresh_interval: Seconds between reloads
+            canonical: Kind -> names ranked first among equally similar names
+        """
+        self._loaders = loaders
+        self.refresh_interval = refresh_interval
+        self.canonical = canonical or {}
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, loaders: Dict[str, NameLoader]) -> "NameIndex":
+        """Create the index, reloading every FEEDMOB_NAME_INDEX_REFRESH seconds (default 600).
+
+        FEEDMOB_CANONICAL_CLIENTS lists the comma-separated client names preferred
+        among equal matches (default "Uber Technologies").
+        """
+        canonical_clients = os.getenv("FEEDMOB_CANONICAL_CLIENTS", "Uber Technologies")
+        return cls(
+            loaders,
+            refresh_interval=float(os.getenv("FEEDMOB_NAME_INDEX_REFRESH", "600")),
+            canonical={"client": [name.strip() for name in canonical_clients.split(",") if name.strip()]},
+        )
+
+    async def refresh(self) -> None:
+        """Reload every kind of name and swap in the new snapshots."""
+        async with self._lock:
+            await self._load()
+
+    async def ensure_loaded(self) -> None:
+        """Load the index unless it already has been, e.g. before the refresh loop's first run completes."""
+        if self._snapshots:
+            return
+        async with self._lock:
+            if not self._snapshots:
+                await self._load()
+
+    async def _load(self) -> None:
+        started = time.perf_counter()
+        snapshots = {
+            kind: _Snapshot(await load(), self.canonical.get(kind, ())) for kind, load in self._loaders.items()
+        }
+        self._snapshots = snapshots
+        self._loaded_at = time.monotonic()
+        logger.info(
+            "Name index refreshed in %.3fs: %s",
+            time.perf_counter() - started,
+            ", ".join(f"{kind}={len(snapshot.rows)}" for kind, snapshot in snapshots.items()),
+        )
+
+    async def run_refresh_loop(self) -> None:
+        """Preload the index and keep refreshing it; failures keep the previous snapshot."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Name index refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def search(self, query: str, kind: str = "client", limit: int = 5, min_score: float = 0.2) -> List[Dict[str, Any]]:
+        """Rank names of one kind by similarity to query.
+
+        Loads the index first if the refresh loop has not done so yet.
+
+        Returns:
+            List[Dict[str, Any]]: Candidates with id, name and score (1.0 is an exact match)
+
+        Raises:
+            ValueError: If kind is unknown
+        """
+        return (await self._snapshot(kind)).search(query, limit, min_score)
+
+    async def find(self, name: str, kind: str = "client") -> List[Dict[str, Any]]:
+        """Rows whose name equals name case-insensitively, as ilike without wildcards matches."""
+        return list((await self._snapshot(kind)).by_name.get(name.casefold(), ()))
+
+    async def records(self, ids: Sequence[Any], kind: str = "client") -> List[Dict[str, Any]]:
+        """Rows of the given ids in that order, skipping ids no longer loaded."""
+        snapshot = await self._snapshot(kind)
+        return [snapshot.records[id_] for id_ in ids if id_ in snapshot.records]
+
+    async def _snapshot(self, kind: str) -> _Snapshot:
+        if kind not in self._loaders:
+            raise ValueError(f"Unknown name kind: {kind}. Use {', '.join(self._loaders)}")
+        await self.ensure_loaded()
+        return self._snapshots[kind]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sizes": {kind: len(snapshot.rows) for kind, snapshot in self._snapshots.items()},
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "refresh_interval": self.refresh_interval,
+        }
+
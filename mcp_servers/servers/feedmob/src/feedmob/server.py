@@ -1,12 +1,47 @@
+import asyncio
+import json
+import re
 from datetime import date
 from mcp.server.fastmcp import FastMCP
-from typing import List, Dict, Union, Any, Optional
+from pydantic import BaseModel
+from typing import List, Dict, Literal, Union, Any, Optional
+from mcp_results import encoded_result, result_stats
+from .cache import dimension_cache, normalize_name
 from .db import (
+    decode_net_spends_cursor,
+    encode_net_spends_cursor,
     get_db_jampp_campaign_mappings,
+    get_db_net_spend_totals,
     get_db_net_spends,
+    get_db_net_spends_batch,
     get_db_client_infos,
-    get_db_direct_spend_job_stats
+    get_db_client_infos_batch,
+    get_db_client_names,
+    get_db_vendor_names,
+    get_db_direct_spend_job_stats,
+    get_db_stats,
+    run_db
 )
+from .job_stats_index import JobStatsIndex
+from .name_index import NameIndex
+
+DEFAULT_SPEND_PAGE_SIZE = 200
+MAX_SPEND_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 50
+
+# When ilike finds no client, return up to this many close names from the fuzzy index
+CLIENT_FALLBACK_LIMIT = 3
+CLIENT_FALLBACK_MIN_SCORE = 0.5
+
+# A client name containing these is an ilike pattern, matched in the database
+ILIKE_PATTERN = re.compile(r"[%_\\]")
+
+name_index = NameIndex.from_env({
+    "client": lambda: run_db(get_db_client_names),
+    "vendor": lambda: run_db(get_db_vendor_names),
+})
+
+job_stats_index = JobStatsIndex.from_env(lambda since: run_db(get_db_direct_spend_job_stats, since))
 
 mcp = FastMCP(
     name="Feedmob Report",
@@ -16,11 +51,15 @@ mcp = FastMCP(
 
 
 @mcp.tool()
-def get_client_infos(
+@encoded_result
+async def get_client_infos(
     client_name: str,
 ) -> List[Dict[str, Any]]:
     """Get detailed information about a client.
 
+    When no client name matches, the closest names from the fuzzy name index
+    are returned instead; check the returned name before using it.
+
     Args:
         client_name (str): Name of the client to search for (supports partial matches)
 
@@ -38,11 +77,87 @@ def get_client_infos(
     if not client_name.strip():
         raise ValueError("client_name cannot be empty")
 
-    return get_db_client_infos(client_name)
+    client_name = normalize_name(client_name)
+    # ilike matching is case-insensitive, so the key is too
+    return await dimension_cache.get_or_load(
+        ("client_infos", client_name.casefold()),
+        lambda: _load_client_infos(client_name),
+    )
+
+
+async def _load_client_infos(client_name: str) -> List[Dict[str, Any]]:
+    """Answer from the name index, then match with ilike, then fall back to the closest names in the index.
+
+    The database is only queried for ilike patterns and names added since the index was loaded.
+    """
+    clients = await _indexed_client_infos(client_name)
+    if not clients:
+        clients = await run_db(get_db_client_infos, client_name)
+    return clients or await _fuzzy_client_infos(client_name)
+
+
+async def _indexed_client_infos(client_name: str) -> List[Dict[str, Any]]:
+    if ILIKE_PATTERN.search(client_name):
+        return []
+    return await name_index.find(client_name, "client")
+
+
+async def _fuzzy_client_infos(client_name: str) -> List[Dict[str, Any]]:
+    candidates = await name_index.search(client_name, "client", limit=CLIENT_FALLBACK_LIMIT, min_score=CLIENT_FALLBACK_MIN_SCORE)
+    return await name_index.records([candidate["id"] for candidate in candidates], "client")
+
+
+@mcp.tool()
+@encoded_result
+async def get_client_infos_batch(
+    client_names: List[str],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Get detailed information about several clients in one call.
+
+    Args:
+        client_names (List[str]): Names of the clients to search for (supports partial matches), at most 50
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Client records keyed by the searched name, see get_client_infos
+
+    Raises:
+        ValueError: If client_names is empty or too long, or contains an empty name
+    """
+    if not client_names:
+        raise ValueError("client_names cannot be empty")
+    if len(client_names) > MAX_BATCH_SIZE:
+        raise ValueError(f"client_names cannot contain more than {MAX_BATCH_SIZE} entries")
+    if any(not name.strip() for name in client_names):
+        raise ValueError("client_name cannot be empty")
+
+    names = list(dict.fromkeys(normalize_name(name) for name in client_names))
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    missing = []
+    for name in names:
+        found, clients = dimension_cache.get(("client_infos", name.casefold()))
+        if not found:
+            clients = await _indexed_client_infos(name)
+            found = bool(clients)
+            if found:
+                dimension_cache.set(("client_infos", name.casefold()), clients)
+        if found:
+            results[name] = clients
+        else:
+            missing.append(name)
+
+    if missing:
+        loaded = await run_db(get_db_client_infos_batch, missing)
+        for name in missing:
+            clients = loaded[name] or await _fuzzy_client_infos(name)
+            dimension_cache.set(("client_infos", name.casefold()), clients)
+            results[name] = clients
+
+    return {name: results[name] for name in names}
 
 
 @mcp.tool()
-def get_jampp_campaign_mappings(
+@encoded_result
+async def get_jampp_campaign_mappings(
     client_name: str,
     vendor_name: str,
 ) -> List[Dict[str, Any]]:
@@ -70,31 +185,53 @@ def get_jampp_campaign_mappings(
     if not vendor_name.strip():
         raise ValueError("vendor_name cannot be empty")
 
-    return get_db_jampp_campaign_mappings(client_name, vendor_name)
+    client_name = normalize_name(client_name)
+    vendor_name = normalize_name(vendor_name)
+    return await dimension_cache.get_or_load(
+        ("jampp_campaign_mappings", client_name.casefold(), vendor_name),
+        lambda: run_db(get_db_jampp_campaign_mappings, client_name, vendor_name),
+    )
 
 
 @mcp.tool()
-def get_client_vendor_direct_spend(
+@encoded_result
+async def get_client_vendor_direct_spend(
     client_name: str,
     vendor_name: str,
     start_date: date,
     end_date: date,
-) -> List[Dict[str, Any]]:
+    group_by: Optional[List[Literal["day", "campaign", "click_url"]]] = None,
+    page_size: int = DEFAULT_SPEND_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
     """Get client vendor direct spend between two dates.
 
+    Totals are always computed in the database. Use group_by to get sums per
+    day, campaign and/or click url instead of individual spend rows; most
+    questions only need group_by=["campaign"].
+
     Args:
         client_name (str): Name of the client
         vendor_name (str): Name of the vendor
         start_date (date): Start date for the report (inclusive)
         end_date (date): End date for the report (inclusive)
+        group_by (List[str], optional): Any of "day", "campaign", "click_url". Omit for raw spend rows
+        page_size (int, optional): Maximum records per page (default 200, at most 1000)
+        cursor (str, optional): next_cursor from the previous page, with the same group_by
 
     Returns:
-        List[Dict[str, Union[str, int, float]]]: List of spend records with dates and amounts
+        Dict[str, Any]: Spend page containing:
+            - group_by: Dimensions the records are grouped by
+            - totals: gross_spend, net_spend and row_count for the whole range (first page only)
+            - records: Spend records (grouped records also contain row_count;
+              click_url_id 0 means spend without a click url)
+            - next_cursor: Cursor for the next page, null on the last page
 
     Raises:
         ValueError: If any parameter is None
         ValueError: If end_date is before start_date
         ValueError: If client_name or vendor_name is empty
+        ValueError: If page_size is out of range or the cursor is invalid
     """
     if client_name is None:
         raise ValueError("client_name cannot be None")
@@ -111,20 +248,45 @@ def get_client_vendor_direct_spend(
         raise ValueError("vendor_name cannot be empty")
     if end_date < start_date:
         raise ValueError("end_date cannot be before start_date")
+    if not 1 <= page_size <= MAX_SPEND_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_SPEND_PAGE_SIZE}")
+
+    group_by = list(dict.fromkeys(group_by or []))
+    after = decode_net_spends_cursor(cursor, group_by) if cursor else None
+    filters = {
+        "client_name": client_name,
+        "vendor_name": vendor_name,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+    }
+
+    # One extra record tells whether there is a next page
+    spends_call = run_db(get_db_net_spends, **filters, group_by=group_by, limit=page_size + 1, after=after)
+    if cursor:
+        spends, totals = await spends_call, None
+    else:
+        spends, totals = await asyncio.gather(spends_call, run_db(get_db_net_spend_totals, **filters))
+
+    next_cursor = None
+    if len(spends) > page_size:
+        spends = spends[:page_size]
+        next_cursor = encode_net_spends_cursor(spends[-1], group_by)
+
+    result: Dict[str, Any] = {"group_by": group_by}
+    if totals is not None:
+        result["totals"] = {
+            "gross_spend": float(totals["gross_spend"] or 0),
+            "net_spend": float(totals["net_spend"] or 0),
+            "row_count": totals["row_count"],
+        }
+    result["records"] = [_format_spend(spend, group_by) for spend in spends]
+    result["next_cursor"] = next_cursor
+    return result
 
 
-    # Get net spends for these campaigns
-    spends = get_db_net_spends(
-        client_name=client_name,
-        vendor_name=vendor_name,
-        start_date=start_date.isoformat(),
-        end_date=end_date.isoformat()
-    )
-
-    # Format the response
-    result = []
-    for spend in spends:
-        result.append({
+def _format_spend(spend: Dict[str, Any], group_by: List[str]) -> Dict[str, Any]:
+    if not group_by:
+        return {
             "client_name": spend["client_name"],
             "vendor_name": spend["vendor_name"],
             "campaign_id": spend["campaign_id"],
@@ -133,13 +295,96 @@ def get_client_vendor_direct_spend(
             "spend_date": spend["spend_date"],
             "gross_spend": float(spend["gross_spend"]),
             "net_spend": float(spend["net_spend"])
-        })
+        }
+    record = {key: value for key, value in spend.items() if key not in ("gross_spend", "net_spend")}
+    record["gross_spend"] = float(spend["gross_spend"])
+    record["net_spend"] = float(spend["net_spend"])
+    return record
 
-    return result
+
+class ClientVendorPair(BaseModel):
+    client_name: str
+    vendor_name: str
 
 
 @mcp.tool()
-def get_direct_spend_job_stats(
+@encoded_result
+async def get_client_vendor_direct_spend_batch(
+    pairs: List[ClientVendorPair],
+    start_date: date,
+    end_date: date,
+    group_by: Optional[List[Literal["day", "campaign", "click_url"]]] = None,
+) -> Dict[str, Any]:
+    """Get direct spend totals for several client / vendor pairs in one call.
+
+    Use this instead of calling get_client_vendor_direct_spend once per client
+    or vendor when comparing them. All pairs are summed in one database query.
+
+    Args:
+        pairs (List[ClientVendorPair]): Client / vendor pairs to compare, at most 50
+        start_date (date): Start date for the report (inclusive)
+        end_date (date): End date for the report (inclusive)
+        group_by (List[str], optional): Any of "day", "campaign", "click_url" to also get per-group sums.
+            Omit to get only the totals of each pair
+
+    Returns:
+        Dict[str, Any]: Spend keyed by pair:
+            - group_by: Dimensions the records are grouped by
+            - results: "client_name / vendor_name" -> {client_name, vendor_name, totals, records (with group_by)}
+
+    Raises:
+        ValueError: If pairs is empty or too long
+        ValueError: If end_date is before start_date
+        ValueError: If a client_name or vendor_name is empty
+    """
+    if not pairs:
+        raise ValueError("pairs cannot be empty")
+    if len(pairs) > MAX_BATCH_SIZE:
+        raise ValueError(f"pairs cannot contain more than {MAX_BATCH_SIZE} entries")
+    if end_date < start_date:
+        raise ValueError("end_date cannot be before start_date")
+
+    keys = list(dict.fromkeys(
+        (normalize_name(pair.client_name), normalize_name(pair.vendor_name)) for pair in pairs
+    ))
+    if any(not client_name or not vendor_name for client_name, vendor_name in keys):
+        raise ValueError("client_name and vendor_name cannot be empty")
+
+    group_by = list(dict.fromkeys(group_by or []))
+    filters = {"pairs": keys, "start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    calls = [run_db(get_db_net_spends_batch, **filters)]
+    if group_by:
+        calls.append(run_db(get_db_net_spends_batch, **filters, group_by=group_by))
+    totals, *grouped = await asyncio.gather(*calls)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for client_name, vendor_name in keys:
+        entry: Dict[str, Any] = {
+            "client_name": client_name,
+            "vendor_name": vendor_name,
+            "totals": {"gross_spend": 0.0, "net_spend": 0.0, "row_count": 0},
+        }
+        if group_by:
+            entry["records"] = []
+        results[f"{client_name} / {vendor_name}"] = entry
+
+    entries = list(results.values())
+    for total in totals:
+        entries[total["pair_index"] - 1]["totals"] = {
+            "gross_spend": float(total["gross_spend"]),
+            "net_spend": float(total["net_spend"]),
+            "row_count": total["row_count"],
+        }
+    for spend in (grouped[0] if grouped else []):
+        record = _format_spend(spend, group_by)
+        entries[record.pop("pair_index") - 1]["records"].append(record)
+
+    return {"group_by": group_by, "results": results}
+
+
+@mcp.tool()
+@encoded_result
+async def get_direct_spend_job_stats(
     client_ids: Optional[List[int]] = None,
     vendor_ids: Optional[List[int]] = None,
     click_url_ids: Optional[List[int]] = None,
@@ -148,6 +393,8 @@ def get_direct_spend_job_stats(
     """Get direct spend job stats information. This tool is commonly used to check spend data sources
     and understand how the net_spends table is populated.
 
+    Answered from an in-memory index of the table that is refreshed every minute.
+
     Args:
         client_ids (List[int], optional): List of client IDs to filter by
         vendor_ids (List[int], optional): List of vendor IDs to filter by
@@ -210,7 +457,7 @@ def get_direct_spend_job_stats(
         if not all(isinstance(x, int) for x in click_url_ids):
             raise ValueError("click_url_ids must contain only integers")
 
-    return get_db_direct_spend_job_stats(
+    return await job_stats_index.lookup(
         client_ids=client_ids,
         vendor_ids=vendor_ids,
         click_url_ids=click_url_ids,
@@ -218,5 +465,97 @@ def get_direct_spend_job_stats(
     )
 
 
+@mcp.tool()
+@encoded_result
+async def invalidate_feedmob_cache(
+    lookup: Optional[Literal["client_infos", "jampp_campaign_mappings"]] = None,
+) -> Dict[str, Any]:
+    """Drop cached client and campaign mapping lookups so the next call reads the database.
+
+    Use this when the user says clients or campaign mappings were just changed.
+    Dropping all lookups also reloads the fuzzy client and vendor name index.
+
+    Args:
+        lookup (str, optional): Only drop this lookup's results; all cached results when omitted
+
+    Returns:
+        Dict[str, Any]: Number of cache entries removed
+    """
+    removed = dimension_cache.invalidate(lookup)
+    if lookup is None:
+        await name_index.refresh()
+    return {"removed": removed}
+
+
+@mcp.tool()
+@encoded_result
+async def search_feedmob_names(
+    name: str,
+    kind: Literal["client", "vendor"] = "client",
+    limit: int = 5,
+) -> List[Dict[str, Any]]:
+    """Find Feedmob client or vendor names similar to a possibly misspelled or partial name.
+
+    Uses an in-memory trigram index, so it is cheap to call before other tools
+    to resolve a name like "Uber" to "Uber Technologies".
+
+    Args:
+        name (str): Name as the user wrote it
+        kind (str, optional): "client" (default) or "vendor"
+        limit (int, optional): Maximum number of candidates (default 5)
+
+    Returns:
+        List[Dict[str, Any]]: Candidates ranked by similarity, each containing:
+            - id: Client or vendor ID
+            - name: Exact name to use with the other Feedmob tools
+            - score: Similarity between 0 and 1 (1 is an exact match)
+
+    Raises:
+        ValueError: If name is empty
+    """
+    if not name.strip():
+        raise ValueError("name cannot be empty")
+
+    return await name_index.search(name, kind, limit=limit)
+
+
+@mcp.resource("feedmob://stats/cache")
+def cache_stats() -> str:
+    """Dimension lookup cache size and hit rates."""
+    return json.dumps(dimension_cache.stats(), indent=2)
+
+
+@mcp.resource("feedmob://stats/names")
+def name_index_stats() -> str:
+    """Fuzzy name index sizes and age."""
+    return json.dumps(name_index.stats(), indent=2)
+
+
+@mcp.resource("feedmob://stats/job_stats")
+def job_stats_index_stats() -> str:
+    """Direct spend job stats index size and freshness."""
+    return json.dumps(job_stats_index.stats(), indent=2)
+
+
+@mcp.resource("feedmob://stats/results")
+def results_stats() -> str:
+    """Result format and bytes saved by the columnar encoding."""
+    return json.dumps(result_stats(), indent=2)
+
+
+@mcp.resource("feedmob://stats/db")
+def db_stats() -> str:
+    """Connection pool status plus pool checkout and query timings."""
+    return json.dumps(get_db_stats(), indent=2)
+
+
 async def main():
-    await mcp.run_stdio_async()
+    refreshes = [
+        asyncio.create_task(name_index.run_refresh_loop()),
+        asyncio.create_task(job_stats_index.run_refresh_loop()),
+    ]
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        for refresh in refreshes:
+            refresh.cancel()
@@ -1,4 +1,7 @@
-from typing import Dict, List
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
 
 import httpx
 from httpx import Timeout
@@ -9,48 +12,124 @@ from tenacity import (
     wait_exponential,
 )
 
+logger = logging.getLogger(__name__)
 
-class InmobiAPIService:
-    """Service for interacting with the InMobi API."""
+REPORT_STATUS_AVAILABLE = "report.status.available"
+REPORT_STATUS_FAILED = "report.status.failed"
 
-    BASE_URL = "https://api.cdr.inmobi.com/api/v3"
+# report type -> (submit endpoint, os filter)
+REPORT_TYPES = {
+    "skan": ("/reports/skan", "iOS"),
+    "non_skan": ("/reports/programmatic", "Android"),
+}
+
+DEFAULT_TIMEOUT = Timeout(30, connect=10, read=20, write=10)
+DOWNLOAD_TIMEOUT = Timeout(120, connect=60, read=60, write=60)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, access_config: Dict[str, str]):
-        """Initialize with API credentials.
+
+class InmobiTokenManager:
+    """Caches the InMobi access token until shortly before it expires.
+
+    Concurrent callers share a single refresh request, and a token rejected
+    with 401 can be invalidated so the next caller fetches a new one.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        client_id: Optional[str],
+        client_secret: Optional[str],
+        default_ttl: float = 3600,
+        refresh_margin: float = 60,
+    ):
+        """Create the token manager.
 
         Args:
-            access_config: Dictionary containing API credentials
+            client: Shared HTTP client
+            client_id: InMobi API client ID
+            client_secret: InMobi API client secret
+            default_ttl: Token lifetime in seconds when the auth response does not say
+            refresh_margin: Seconds before expiry at which the token is refreshed
         """
-        self.client_id = access_config.get("client_id")
-        self.client_secret = access_config.get("client_secret")
-        self._token = None
-        self._skan_report_id = None
-        self._non_skan_report_id = None
+        self._client = client
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._default_ttl = default_ttl
+        self._refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self.fetches = 0
+
+    async def token(self) -> str:
+        """Return a valid access token, fetching one if needed."""
+        if self._valid():
+            return self._token
+        async with self._lock:
+            if not self._valid():
+                await self._fetch()
+            return self._token
+
+    def invalidate(self, token: str) -> None:
+        """Drop the cached token if it is still the rejected one."""
+        if self._token == token:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self._refresh_margin
 
     @retry(
         retry=retry_if_exception_type(httpx.HTTPError),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
     )
-    def get_access_token(self) -> str:
+    async def _fetch(self) -> None:
         """Retrieve access token from InMobi auth endpoint."""
-        response = httpx.post(
-            f"{self.BASE_URL}/auth/token",
-            json={"clientId": self.client_id, "clientSecret": self.client_secret},
+        response = await self._client.post(
+            "/auth/token",
+            json={"clientId": self._client_id, "clientSecret": self._client_secret},
             headers={"Content-Type": "application/json;charset=utf-8"},
-            timeout=Timeout(30, connect=10, read=20, write=10),
         )
         response.raise_for_status()
-        return response.json().get("data", {}).get("token")
+        data = response.json().get("data", {})
+        self._token = data.get("token")
+        self._expires_at = time.monotonic() + _token_ttl(data, self._default_ttl)
+        self.fetches += 1
+        logger.info("Fetched InMobi access token (%d fetches so far)", self.fetches)
 
-    def access_token(self) -> str:
-        """Get cached access token or retrieve a new one."""
-        if not self._token:
-            self._token = self.get_access_token()
-        return self._token
 
-    def get_report_ids(self, start_date: str, end_date: str) -> List[str]:
-        """Get report IDs for SKAN and non-SKAN data.
+class InmobiAPIService:
+    """Service for interacting with the InMobi API.
+
+    One instance is meant to be shared per process: it owns a keep-alive
+    AsyncClient and the cached access token.
+    """
+
+    BASE_URL = "https://api.cdr.inmobi.com/api/v3"
+
+    def __init__(self, access_config: Dict[str, str], client: Optional[httpx.AsyncClient] = None):
+        """Initialize with API credentials.
+
+        Args:
+            access_config: Dictionary containing API credentials
+            client: HTTP client to use, a pooled keep-alive client is created when omitted
+        """
+        self._client = client or httpx.AsyncClient(
+            base_url=self.BASE_URL,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self.tokens = InmobiTokenManager(
+            self._client,
+            access_config.get("client_id"),
+            access_config.get("client_secret"),
+            default_ttl=float(access_config.get("token_ttl") or 3600),
+        )
+
+    async def get_report_ids(self, start_date: str, end_date: str) -> List[str]:
+        """Get report IDs for SKAN and non-SKAN data, submitting both reports concurrently.
 
         Args:
             start_date: Start date in YYYY-MM-DD format
@@ -59,66 +138,36 @@ class InmobiAPIService:
         Returns:
             List containing [skan_report_id, non_skan_report_id]
         """
-        # Ensure we have a token
-        self.access_token()
-
-        # Get SKAN report ID for iOS
-        skan_report_id = self._get_skan_report_id(start_date, end_date)
-
-        # Get non-SKAN report ID for Android
-        non_skan_report_id = self._get_non_skan_report_id(start_date, end_date)
-
-        return [skan_report_id, non_skan_report_id]
+        return list(await asyncio.gather(
+            self.submit_report("skan", start_date, end_date),
+            self.submit_report("non_skan", start_date, end_date),
+        ))
 
     @retry(
         retry=retry_if_exception_type(httpx.HTTPError),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
     )
-    def _get_skan_report_id(self, start_date: str, end_date: str) -> str:
-        """Request SKAN report generation and get report ID."""
-        if self._skan_report_id:
-            return self._skan_report_id
+    async def submit_report(self, report_type: str, start_date: str, end_date: str) -> str:
+        """Request report generation and get report ID.
 
-        payload = self._create_report_payload(start_date, end_date, "iOS")
-
-        response = httpx.post(
-            f"{self.BASE_URL}/reports/skan",
-            json=payload,
-            headers={
-                "Authorization": self.access_token(),
-                "Content-Type": "application/json;charset=utf-8",
-            },
-            timeout=Timeout(30, connect=10, read=20, write=10),
-        )
-        response.raise_for_status()
-        self._skan_report_id = response.json().get("data", {}).get("reportId")
-        return self._skan_report_id
-
-    @retry(
-        retry=retry_if_exception_type(httpx.HTTPError),
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-    )
-    def _get_non_skan_report_id(self, start_date: str, end_date: str) -> str:
-        """Request non-SKAN report generation and get report ID."""
-        if self._non_skan_report_id:
-            return self._non_skan_report_id
-
-        payload = self._create_report_payload(start_date, end_date, "Android")
+        Args:
+            report_type: "skan" (iOS) or "non_skan" (Android)
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
 
-        response = httpx.post(
-            f"{self.BASE_URL}/reports/programmatic",
+        Returns:
+            The ID of the submitted report
+        """
+        path, os = REPORT_TYPES[report_type]
+        payload = self._create_report_payload(start_date, end_date, os)
+        response = await self._request(
+            "POST",
+            path,
             json=payload,
-            headers={
-                "Authorization": self.access_token(),
-                "Content-Type": "application/json;charset=utf-8",
-            },
-            timeout=Timeout(30, connect=10, read=20, write=10),
+            headers={"Content-Type": "application/json;charset=utf-8"},
         )
-        response.raise_for_status()
-        self._non_skan_report_id = response.json().get("data", {}).get("reportId")
-        return self._non_skan_report_id
+        return response.json().get("data", {}).get("reportId")
 
     def _create_report_payload(self, start_date: str, end_date: str, os: str) -> Dict:
         """Create payload for report generation requests."""
@@ -134,7 +183,7 @@ class InmobiAPIService:
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
     )
-    def check_report_status_once(self, report_id: str) -> str:
+    async def check_report_status_once(self, report_id: str) -> str:
         """Check the status of a report once.
 
         Args:
@@ -143,69 +192,58 @@ class InmobiAPIService:
         Returns:
             The status of the report
         """
-        response = httpx.get(
-            f"{self.BASE_URL}/reports/{report_id}/status",
-            headers={"Authorization": self.access_token()},
-            timeout=Timeout(30, connect=10, read=20, write=10),
-        )
-        response.raise_for_status()
+        response = await self._request("GET", f"/reports/{report_id}/status")
         return response.json().get("data", {}).get("reportStatus")
 
-    @retry(
-        stop=stop_after_attempt(24), wait=wait_exponential(multiplier=1, min=5, max=60)
-    )
-    def _check_report_status(self, report_id: str) -> bool:
-        """Check if a report is available for download with retries.
-
-        Args:
-            report_id: The ID of the report to check
-
-        Returns:
-            True if the report is available, False otherwise
-
-        Raises:
-            RetryError: If the report is not available after max retries
-        """
-        status = self.check_report_status_once(report_id)
-        if status == "report.status.available":
-            return True
-        # This will trigger a retry if the status is not "available"
-        raise ValueError(f"Report not available yet, status: {status}")
-
     @retry(
         retry=retry_if_exception_type(httpx.HTTPError),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
     )
-    def _fetch_report_data(self, report_id: str) -> str:
-        """Download report data and convert to list of dictionaries.
+    async def download_report(self, report_id: str, path: str) -> int:
+        """Stream report data to a local CSV file without holding it in memory.
 
         Args:
             report_id: The ID of the report to download
+            path: File to write the CSV data to
 
         Returns:
-            Report data in CSV format
+            Number of bytes written
         """
-        response = httpx.get(
-            f"{self.BASE_URL}/reports/{report_id}/download",
-            headers={"Authorization": self.access_token()},
-            timeout=Timeout(120, connect=60, read=60, write=60),
-        )
+        token = await self.tokens.token()
+        size = 0
+        async with self._client.stream(
+            "GET", f"/reports/{report_id}/download", headers={"Authorization": token}, timeout=DOWNLOAD_TIMEOUT
+        ) as response:
+            if response.status_code == 401:
+                # The retry fetches a fresh token
+                self.tokens.invalidate(token)
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+        return size
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _request(self, method: str, url: str, *, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> httpx.Response:
+        """Send an authorized request, refreshing the token once if it is rejected with 401."""
+        token = await self.tokens.token()
+        response = await self._client.request(method, url, headers={**(headers or {}), "Authorization": token}, **kwargs)
+        if response.status_code == 401:
+            self.tokens.invalidate(token)
+            token = await self.tokens.token()
+            response = await self._client.request(method, url, headers={**(headers or {}), "Authorization": token}, **kwargs)
         response.raise_for_status()
+        return response
 
-        return response.text
-
-    def load(self, report_id: str) -> str:
-        """
-        Load campaign data from InMobi.
 
-        Args:
-            report_id: The ID of the report to load from InMobi
-
-        Returns:
-            Report data in CSV format
-        """
-        if self._check_report_status(report_id):
-            return self._fetch_report_data(report_id)
-        else:
-            raise Exception("Report not available yet")
+def _token_ttl(data: Dict[str, Any], default: float) -> float:
+    """Token lifetime in seconds from the auth response, which may not include one."""
+    for key in ("expiresIn", "expires_in", "expiry"):
+        value = data.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return default
@@ -5,4 +5,21 @@ def get_access_config() -> dict:
     return {
         "client_id": os.environ["INMOBI_CLIENT_ID"],
         "client_secret": os.environ["INMOBI_CLIENT_SECRET"],
+        "token_ttl": os.environ.get("INMOBI_TOKEN_TTL"),
     }
+
+
+def data_dir() -> str:
+    """Private directory for downloaded reports and the report registry, from INMOBI_DATA_DIR (default ~/.cache/inmobi)."""
+    return ensure_private_dir(os.getenv("INMOBI_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "inmobi"))
+
+
+def ensure_private_dir(path: str) -> str:
+    """Create path readable only by the current user; refuse a directory owned by someone else."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.stat(path)
+    if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+        raise PermissionError(f"Directory {path} is owned by another user")
+    if stat.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
@@ -0,0 +1,273 @@
+"""Background polling and download of Inmobi reports."""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from inmobi.inmobi_api_service import REPORT_STATUS_AVAILABLE, REPORT_STATUS_FAILED, InmobiAPIService
+from inmobi.integration_configs import data_dir, ensure_private_dir
+
+logger = logging.getLogger(__name__)
+
+# Report IDs end up in file names and URL paths, so nothing else is accepted
+REPORT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Seconds between sweeps for expired jobs and report files
+EVICTION_INTERVAL = 600
+
+
+class JobState(str, Enum):
+    PENDING = "pending"
+    DOWNLOADING = "downloading"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class ReportJob:
+    """State of one tracked report."""
+
+    report_id: str
+    state: JobState = JobState.PENDING
+    report_status: Optional[str] = None
+    polls: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    next_poll_at: Optional[float] = None
+    path: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "report_id": self.report_id,
+            "state": self.state.value,
+            "report_status": self.report_status,
+            "polls": self.polls,
+            "age_seconds": round(now - self.created_at),
+            "next_poll_in_seconds": round(max(0.0, self.next_poll_at - now)) if self.next_poll_at else None,
+            "size_bytes": self.size,
+            "error": self.error,
+        }
+
+
+class ReportJobManager:
+    """Tracks many Inmobi reports at once without blocking tool calls.
+
+    Each tracked report gets an asyncio task that polls the status endpoint
+    with exponential backoff and jitter, then downloads the report into
+    download_dir once it is available. Tools only read the job state.
+    Completed and failed jobs are evicted together with their files once
+    they are older than ttl.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], InmobiAPIService],
+        download_dir: str,
+        initial_delay: float = 15,
+        max_delay: float = 120,
+        timeout: float = 3600,
+        max_errors: int = 5,
+        ttl: float = 24 * 3600,
+    ):
+        """Create the manager.
+
+        Args:
+            service_factory: Returns the API service used for polling and downloads
+            download_dir: Directory completed reports are stored in, created private to the current user
+            initial_delay: Seconds before the first status check
+            max_delay: Upper bound of the backoff between status checks
+            timeout: Seconds after which a report that is still not available is marked failed
+            max_errors: Consecutive request errors after which a job is marked failed
+            ttl: Seconds a completed or failed job and its downloaded report are kept
+        """
+        self._service_factory = service_factory
+        self.download_dir = ensure_private_dir(download_dir)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self.ttl = ttl
+        self._jobs: Dict[str, ReportJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._next_eviction = 0.0
+
+    @classmethod
+    def from_env(cls, service_factory: Callable[[], InmobiAPIService]) -> "ReportJobManager":
+        """Create the manager from INMOBI_DOWNLOAD_DIR, INMOBI_POLL_INITIAL_DELAY, INMOBI_POLL_MAX_DELAY,
+        INMOBI_JOB_TIMEOUT and INMOBI_JOB_TTL (default 86400)."""
+        return cls(
+            service_factory,
+            download_dir=os.getenv("INMOBI_DOWNLOAD_DIR") or os.path.join(data_dir(), "reports"),
+            initial_delay=float(os.getenv("INMOBI_POLL_INITIAL_DELAY", "15")),
+            max_delay=float(os.getenv("INMOBI_POLL_MAX_DELAY", "120")),
+            timeout=float(os.getenv("INMOBI_JOB_TIMEOUT", "3600")),
+            ttl=float(os.getenv("INMOBI_JOB_TTL", str(24 * 3600))),
+        )
+
+    def track(self, report_id: str) -> ReportJob:
+        """Start tracking a report, or return its job if it is already tracked.
+
+        A failed job is tracked again from scratch, and a report downloaded
+        before a restart is completed right away.
+
+        Raises:
+            ValueError: The report ID is not a plain Inmobi report ID
+        """
+        path = self._path(report_id)
+        self._evict_expired()
+        job = self._jobs.get(report_id)
+        if job is not None and job.state != JobState.FAILED:
+            return job
+
+        if os.path.exists(path):
+            # Aged from the download, so the file is still evicted on time
+            downloaded_at = os.path.getmtime(path)
+            job = ReportJob(
+                report_id=report_id,
+                state=JobState.COMPLETED,
+                report_status=REPORT_STATUS_AVAILABLE,
+                created_at=downloaded_at,
+                updated_at=downloaded_at,
+                path=path,
+                size=os.path.getsize(path),
+            )
+            self._jobs[report_id] = job
+            return job
+
+        job = ReportJob(report_id=report_id, next_poll_at=time.time() + self.initial_delay)
+        self._jobs[report_id] = job
+        self._tasks[report_id] = asyncio.create_task(self._run(job), name=f"inmobi-report-{report_id}")
+        return job
+
+    def get(self, report_id: str) -> Optional[ReportJob]:
+        return self._jobs.get(report_id)
+
+    def known(self, report_id: str) -> bool:
+        """Whether the report is tracked or was downloaded before.
+
+        Raises:
+            ValueError: The report ID is not a plain Inmobi report ID
+        """
+        return report_id in self._jobs or os.path.exists(self._path(report_id))
+
+    def jobs(self) -> List[ReportJob]:
+        self._evict_expired()
+        return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    async def _run(self, job: ReportJob) -> None:
+        delay = self.initial_delay
+        errors = 0
+        deadline = job.created_at + self.timeout
+        try:
+            while True:
+                await asyncio.sleep(max(0.0, job.next_poll_at - time.time()))
+                try:
+                    status = await self._service_factory().check_report_status_once(job.report_id)
+                except Exception as e:
+                    errors += 1
+                    logger.warning("Inmobi report %s status check failed (%d): %s", job.report_id, errors, e)
+                    if errors >= self.max_errors:
+                        self._fail(job, f"status check failed {errors} times: {e}")
+                        return
+                else:
+                    errors = 0
+                    job.polls += 1
+                    job.report_status = status
+                    job.updated_at = time.time()
+                    if status == REPORT_STATUS_AVAILABLE:
+                        await self._download(job)
+                        return
+                    if status == REPORT_STATUS_FAILED:
+                        self._fail(job, "Inmobi failed to generate the report")
+                        return
+
+                if time.time() >= deadline:
+                    self._fail(job, f"report not available after {self.timeout:.0f} seconds")
+                    return
+                delay = min(self.max_delay, delay * 2)
+                # Jitter keeps many jobs submitted together from polling in lockstep
+                job.next_poll_at = time.time() + delay * random.uniform(0.8, 1.2)
+        finally:
+            self._tasks.pop(job.report_id, None)
+
+    async def _download(self, job: ReportJob) -> None:
+        job.state = JobState.DOWNLOADING
+        job.next_poll_at = None
+        job.updated_at = time.time()
+        ensure_private_dir(self.download_dir)
+        path = self._path(job.report_id)
+        # Download next to the final path and rename, so a partial file is never taken as completed
+        part_path = f"{path}.part"
+        try:
+            job.size = await self._service_factory().download_report(job.report_id, part_path)
+            os.replace(part_path, path)
+        except Exception as e:
+            logger.warning("Inmobi report %s download failed: %s", job.report_id, e)
+            self._fail(job, f"download failed: {e}")
+            return
+        job.path = path
+        job.state = JobState.COMPLETED
+        job.updated_at = time.time()
+        logger.info("Inmobi report %s downloaded: %d bytes", job.report_id, job.size)
+
+    def _evict_expired(self) -> None:
+        """Drop finished jobs older than ttl and delete their reports, at most every EVICTION_INTERVAL seconds.
+
+        Report files left behind by jobs of an earlier run, including partial
+        downloads, are deleted once they are older than ttl as well.
+        """
+        now = time.time()
+        if now < self._next_eviction:
+            return
+        self._next_eviction = now + min(self.ttl, EVICTION_INTERVAL)
+
+        for report_id, job in list(self._jobs.items()):
+            if job.state in (JobState.COMPLETED, JobState.FAILED) and now - job.updated_at > self.ttl:
+                del self._jobs[report_id]
+                path = self._path(report_id)
+                _remove(path)
+                _remove(f"{path}.part")
+
+        try:
+            entries = list(os.scandir(self.download_dir))
+        except OSError as e:
+            logger.warning("Could not list Inmobi download directory %s: %s", self.download_dir, e)
+            return
+        for entry in entries:
+            report_id, _, suffix = entry.name.partition(".")
+            if suffix not in ("csv", "csv.part") or report_id in self._jobs:
+                continue
+            try:
+                expired = now - entry.stat().st_mtime > self.ttl
+            except OSError:
+                continue
+            if expired:
+                _remove(entry.path)
+
+    def _path(self, report_id: str) -> str:
+        if not REPORT_ID_PATTERN.match(report_id):
+            raise ValueError(f"Invalid Inmobi report ID {report_id!r}")
+        return os.path.join(self.download_dir, f"{report_id}.csv")
+
+    def _fail(self, job: ReportJob, error: str) -> None:
+        job.state = JobState.FAILED
+        job.error = error
+        job.next_poll_at = None
+        job.updated_at = time.time()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not delete Inmobi report %s: %s", path, e)
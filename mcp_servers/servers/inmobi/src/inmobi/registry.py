@@ -0,0 +1,93 @@
+"""Persistent registry of submitted Inmobi reports keyed by report type and date range."""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from inmobi.integration_configs import data_dir, ensure_private_dir
+
+logger = logging.getLogger(__name__)
+
+RegistryKey = Tuple[str, str, str]
+
+
+class ReportRegistry:
+    """Remembers which report ID was generated for (report type, start date, end date).
+
+    Entries are stored in a JSON file so they survive restarts, and expire
+    after ttl seconds so reports covering recent days are eventually
+    regenerated with fresh data.
+    """
+
+    def __init__(self, path: str, ttl: float = 24 * 3600):
+        """Load the registry.
+
+        Args:
+            path: JSON file the registry is stored in
+            ttl: Seconds a report ID is reused for the same range
+        """
+        self.path = path
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, object]] = self._read()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def from_env(cls) -> "ReportRegistry":
+        """Create the registry from INMOBI_REGISTRY_PATH and INMOBI_REPORT_REUSE_TTL (default 86400)."""
+        return cls(
+            os.getenv("INMOBI_REGISTRY_PATH") or os.path.join(data_dir(), "registry.json"),
+            ttl=float(os.getenv("INMOBI_REPORT_REUSE_TTL", str(24 * 3600))),
+        )
+
+    def lock(self, report_type: str, start_date: str, end_date: str) -> asyncio.Lock:
+        """Lock for one key, so concurrent requests for the same range submit only one report."""
+        return self._locks.setdefault(_key(report_type, start_date, end_date), asyncio.Lock())
+
+    def get(self, report_type: str, start_date: str, end_date: str) -> Optional[str]:
+        """Report ID generated for the range, unless it has expired."""
+        entry = self._entries.get(_key(report_type, start_date, end_date))
+        if entry is None or time.time() - float(entry["created_at"]) > self.ttl:
+            return None
+        return str(entry["report_id"])
+
+    def contains(self, report_id: str) -> bool:
+        """Whether the report was submitted for some range and has not expired."""
+        now = time.time()
+        return any(
+            entry["report_id"] == report_id and now - float(entry["created_at"]) <= self.ttl
+            for entry in self._entries.values()
+        )
+
+    def put(self, report_type: str, start_date: str, end_date: str, report_id: str) -> None:
+        self._entries[_key(report_type, start_date, end_date)] = {
+            "report_id": report_id,
+            "created_at": time.time(),
+        }
+        self._write()
+
+    def _read(self) -> Dict[str, Dict[str, object]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable Inmobi report registry %s: %s", self.path, e)
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if now - float(entry["created_at"]) <= self.ttl}
+
+    def _write(self) -> None:
+        """Replace the file atomically so a crash never leaves it half written."""
+        ensure_private_dir(os.path.dirname(os.path.abspath(self.path)))
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _key(report_type: str, start_date: str, end_date: str) -> str:
+    return f"{report_type}:{start_date}:{end_date}"
@@ -0,0 +1,224 @@
+"""Incremental parsing and aggregation of downloaded Inmobi report CSV files."""
+import csv
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# group_by option -> report columns it groups on
+DIMENSIONS = {
+    "date": ("date",),
+    "campaign": ("campaign_id", "campaign_name"),
+    "os": ("os",),
+}
+DIMENSION_COLUMNS = {column for columns in DIMENSIONS.values() for column in columns}
+
+# Rate columns cannot be summed, so they are left out of totals and groups
+RATE_COLUMNS = re.compile(r"(^|_)(ctr|cvr|cpi|cpc|cpm|ecpm|ipm|rate|ratio|percent(age)?)$")
+
+# Cells meaning "no value" in numeric columns, compared in lower case
+PLACEHOLDERS = {"-", "--", "n/a", "na", "null", "none", "nan"}
+
+PARSED_CACHE_SIZE = 4
+
+
+@dataclass
+class ReportTable:
+    """A report parsed into typed columns."""
+
+    columns: Dict[str, List[Any]]
+    types: Dict[str, str]
+    rows: int
+
+    @property
+    def metrics(self) -> List[str]:
+        """Numeric columns that can be summed."""
+        return [
+            name
+            for name, kind in self.types.items()
+            if kind in ("int", "float") and name not in DIMENSION_COLUMNS and not RATE_COLUMNS.search(name)
+        ]
+
+
+def column_name(header: str) -> str:
+    """Normalize a CSV header, e.g. "Campaign ID" -> "campaign_id"."""
+    return re.sub(r"[^0-9a-z]+", "_", header.strip().lower()).strip("_")
+
+
+def parse_report(path: str) -> ReportTable:
+    """Parse a report CSV row by row into typed columns.
+
+    Each value is converted as its row is read. Dimension columns are
+    strings; any other column starts as int and widens to float on the first
+    fractional value. Empty cells and placeholders such as "N/A" or "-" are
+    None. A column whose first value is not a number is text; once a column
+    holds numbers, a value that is not a number is logged and read as None,
+    so one stray cell never drops a metric.
+    """
+    started = time.perf_counter()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return ReportTable(columns={}, types={}, rows=0)
+        names = [column_name(name) for name in header]
+        columns: List[List[Any]] = [[] for _ in names]
+        types = ["str" if name in DIMENSION_COLUMNS else "int" for name in names]
+        # Numeric columns that have no number yet, and may still turn out to be text
+        untyped = {i for i, kind in enumerate(types) if kind != "str"}
+        invalid: Dict[str, List[str]] = {}
+        rows = 0
+        for row in reader:
+            if not any(row):
+                continue
+            rows += 1
+            for i, values in enumerate(columns):
+                value = row[i].strip() if i < len(row) else ""
+                if types[i] == "str":
+                    values.append(value or None)
+                elif not value or value.lower() in PLACEHOLDERS:
+                    values.append(None)
+                else:
+                    number = _number(value, i, columns, types)
+                    if number is not None:
+                        untyped.discard(i)
+                    elif i in untyped:
+                        # The column's first value is text, so the column is text
+                        types[i] = "str"
+                        untyped.discard(i)
+                        number = value
+                    else:
+                        invalid.setdefault(names[i], []).append(value)
+                    values.append(number)
+
+    for name, values in invalid.items():
+        logger.warning(
+            "Inmobi report %s: %d non-numeric values in numeric column %s read as empty, e.g. %r",
+            path, len(values), name, values[0],
+        )
+    logger.info("Parsed Inmobi report %s: %d rows, %d columns in %.3fs", path, rows, len(names), time.perf_counter() - started)
+    return ReportTable(columns=dict(zip(names, columns)), types=dict(zip(names, types)), rows=rows)
+
+
+def _number(value: str, i: int, columns: List[List[Any]], types: List[str]) -> Any:
+    """Convert a value of numeric column i, widening the column from int to float when the value needs it.
+
+    Returns None when the value is not a number.
+    """
+    cleaned = _clean_number(value)
+    if types[i] == "int":
+        try:
+            return int(cleaned)
+        except ValueError:
+            pass
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    if types[i] == "int":
+        types[i] = "float"
+        columns[i][:] = [None if v is None else float(v) for v in columns[i]]
+    return number
+
+
+_parsed: "OrderedDict[Tuple[str, float, int], ReportTable]" = OrderedDict()
+# Reports are loaded in worker threads, so the cache is only touched under the lock
+_parsed_lock = threading.Lock()
+
+
+def load_report(path: str) -> ReportTable:
+    """Parse a report, reusing the parsed table of the same unchanged file."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    with _parsed_lock:
+        table = _parsed.get(key)
+        if table is not None:
+            _parsed.move_to_end(key)
+            return table
+
+    table = parse_report(path)
+    with _parsed_lock:
+        _parsed[key] = table
+        while len(_parsed) > PARSED_CACHE_SIZE:
+            _parsed.popitem(last=False)
+    return table
+
+
+def aggregate(
+    table: ReportTable,
+    group_by: Sequence[str] = (),
+    top_n: Optional[int] = None,
+    sort_by: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Sum the report's metrics, overall and per group.
+
+    Args:
+        table: Parsed report
+        group_by: Any of "date", "campaign" and "os"; no groups when empty
+        top_n: Only return the top_n groups by sort_by, otherwise all groups in key order
+        sort_by: Metric ranking the groups, defaults to spend when the report has it
+
+    Returns:
+        Dictionary with rows, columns, metrics, totals and, when grouped, groups and records
+    """
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by {unknown}, expected any of {list(DIMENSIONS)}")
+    metrics = table.metrics
+    if sort_by is not None and sort_by not in metrics:
+        raise ValueError(f"Unknown sort_by {sort_by!r}, expected one of {metrics}")
+
+    result: Dict[str, Any] = {
+        "rows": table.rows,
+        "columns": table.types,
+        "metrics": metrics,
+        "totals": {metric: _round(sum(v for v in table.columns[metric] if v is not None)) for metric in metrics},
+    }
+    if not group_by:
+        return result
+
+    keys: List[str] = []
+    for name in group_by:
+        present = [column for column in DIMENSIONS[name] if column in table.columns]
+        if not present:
+            raise ValueError(f"The report has no {name} column, columns are {list(table.columns)}")
+        keys.extend(present)
+
+    key_columns = [table.columns[key] for key in keys]
+    metric_columns = [table.columns[metric] for metric in metrics]
+    groups: Dict[Tuple[Any, ...], List[Any]] = {}
+    for i in range(table.rows):
+        sums = groups.setdefault(tuple(column[i] for column in key_columns), [0] * len(metrics))
+        for j, column in enumerate(metric_columns):
+            if column[i] is not None:
+                sums[j] += column[i]
+
+    records = [
+        {**dict(zip(keys, key)), **{metric: _round(value) for metric, value in zip(metrics, sums)}}
+        for key, sums in groups.items()
+    ]
+    if top_n is not None:
+        sort_by = sort_by or ("spend" if "spend" in metrics else (metrics[0] if metrics else None))
+        if sort_by is not None:
+            records.sort(key=lambda record: record[sort_by], reverse=True)
+        records = records[:top_n]
+    else:
+        records.sort(key=lambda record: tuple("" if record[key] is None else record[key] for key in keys))
+
+    result.update(group_by=list(group_by), sort_by=sort_by, groups=len(groups), records=records)
+    return result
+
+
+def _clean_number(value: str) -> str:
+    """Drop thousands separators and a leading currency sign."""
+    return value.replace(",", "").lstrip("$")
+
+
+def _round(value: Any) -> Any:
+    return round(value, 4) if isinstance(value, float) else value
@@ -1,9 +1,16 @@
+import asyncio
+import json
+from collections import Counter
 from datetime import date
+from typing import Optional, Tuple, Union
 
 from mcp.server.fastmcp import FastMCP
 
-from inmobi.inmobi_api_service import InmobiAPIService
+from inmobi.inmobi_api_service import REPORT_TYPES, InmobiAPIService
 from inmobi.integration_configs import get_access_config
+from inmobi.jobs import JobState, ReportJob, ReportJobManager
+from inmobi.registry import ReportRegistry
+from inmobi.reports import aggregate, load_report
 
 mcp = FastMCP(name="Inmobi Partner Report")
 
@@ -18,14 +25,14 @@ I'm your dedicated assistant for retrieving and analyzing Inmobi Partner Reports
 
 ## How I Can Help You:
 - Generate Inmobi report IDs for any date range you specify
-- Check the status of your requested reports
-- Retrieve and present campaign data once reports are available
+- Check the status of your requested reports, which the server tracks in the background
+- Retrieve and summarize campaign data once reports are downloaded, by date, campaign or OS
 
 ## Working Process:
 1. First, I'll ask you for your desired date range (start date and end date)
 2. I'll generate the necessary report IDs using the `generate_inmobi_report_ids` tool
-3. I'll check the report status using the `check_inmobi_report_status` tool
-4. When reports are ready (status: "report.status.available"), I'll load the data using `load_inmobi_campaign_reports`
+3. I'll check the report status using the `check_inmobi_report_status` tool (or `list_inmobi_report_jobs` for all reports)
+4. When reports are downloaded (state: "completed"), I'll load totals and grouped data using `load_inmobi_campaign_reports`
 
 ## Important Notes:
 - Report generation typically takes at least 5 minutes
@@ -38,62 +45,166 @@ How would you like to proceed? Please provide your desired date range in YYYY-MM
 
 
 @mcp.tool()
-def generate_inmobi_report_ids(start_date: date, end_date: date) -> list[str]:
+async def generate_inmobi_report_ids(start_date: date, end_date: date) -> list[dict]:
     """
     Generate Inmobi report IDs for both SKAN and non-SKAN data within the specified date range.
 
-    This initiates the report generation process on Inmobi's servers. The returned IDs should be
-    saved as they'll be needed to check status and retrieve the reports later.
+    This initiates the report generation process on Inmobi's servers and returns right away.
+    The server then polls the report status in the background and downloads each report
+    as soon as it is available. A report already generated for the same date range
+    (within the last day) is reused instead of being generated again.
 
     Args:
         start_date: Start date in YYYY-MM-DD format
         end_date: End date in YYYY-MM-DD format
 
     Returns:
-        List containing two report IDs: [skan_report_id, non_skan_report_id]
+        List containing the SKAN and non-SKAN report jobs, each with report_type, report_id,
+        reused (true when an existing report was reused) and state
     """
-    return InmobiAPIService(get_access_config()).get_report_ids(
-        start_date=start_date.isoformat(), end_date=end_date.isoformat()
-    )
+    start, end = start_date.isoformat(), end_date.isoformat()
+    report_ids = await asyncio.gather(*(_report_id(report_type, start, end) for report_type in REPORT_TYPES))
+    return [
+        {"report_type": report_type, "reused": reused, **jobs.track(report_id).to_dict()}
+        for report_type, (report_id, reused) in zip(REPORT_TYPES, report_ids)
+    ]
+
+
+async def _report_id(report_type: str, start_date: str, end_date: str) -> Tuple[str, bool]:
+    """Reuse the report registered for the range unless its job failed, otherwise submit a new one."""
+    async with registry.lock(report_type, start_date, end_date):
+        report_id = registry.get(report_type, start_date, end_date)
+        if report_id is not None:
+            job = jobs.get(report_id)
+            if job is None or job.state != JobState.FAILED:
+                return report_id, True
+
+        report_id = await _service().submit_report(report_type, start_date, end_date)
+        registry.put(report_type, start_date, end_date, report_id)
+        return report_id, False
 
 
 @mcp.tool()
-def check_inmobi_report_status(report_id: str) -> str:
+async def check_inmobi_report_status(report_id: str) -> dict:
     """
     Check the current processing status of an Inmobi report.
 
-    Reports typically take at least 5 minutes to generate. Possible statuses include:
-    - "report.status.available": The report ran successfully and is available to download
-    - "report.status.running": The report generation is in process
-    - "report.status.submitted": Query successfully submitted by the user
-    - "report.status.failed": Query failed
+    Returns right away with the state tracked by the server's background polling:
+    - "pending": Inmobi is still generating the report ("report_status" has Inmobi's last status)
+    - "downloading": The report is available and being downloaded
+    - "completed": The report is downloaded, call load_inmobi_campaign_reports
+    - "failed": The report could not be generated or downloaded, see "error"
 
-    If status is not "report.status.available", wait at least 5 minutes before checking again.
+    Reports typically take at least 5 minutes to generate. If the state is "pending",
+    wait a few minutes before checking again.
     Both SKAN and non-SKAN report statuses must be checked separately using their respective IDs.
+    Only report IDs returned by generate_inmobi_report_ids are accepted.
 
     Args:
         report_id: The ID of the report to check
 
     Returns:
-        The status of the report
+        The job state of the report
     """
-    return InmobiAPIService(get_access_config()).check_report_status_once(report_id)
+    return _track_known(report_id).to_dict()
 
 
 @mcp.tool()
-def load_inmobi_campaign_reports(
+async def list_inmobi_report_jobs() -> list[dict]:
+    """
+    List every Inmobi report tracked by the server with its current state.
+    """
+    return [job.to_dict() for job in jobs.jobs()]
+
+
+@mcp.tool()
+async def load_inmobi_campaign_reports(
     report_id: str,
-) -> str:
+    group_by: Optional[list[str]] = None,
+    top_n: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    totals_only: bool = False,
+    raw_csv: bool = False,
+) -> Union[str, dict]:
     """
-    Download and process campaign data from InMobi when report is ready.
+    Return campaign data from InMobi once the report has been downloaded.
+
+    Returns right away: when the report's state is not "completed" yet, the result
+    says so and the report should be checked again later.
+
+    The downloaded report is parsed on the server and summarized instead of being
+    returned as a whole.
 
-    IMPORTANT: Only call this function when report status is "report.status.available".
-    The result is in CSV format.
+    Args:
+        report_id: The report ID
+        group_by: Any of "date", "campaign" and "os" (default: ["campaign"])
+        top_n: Only return the top N groups by sort_by; all groups in key order when omitted
+        sort_by: Metric ranking the top N groups (default: spend when the report has it)
+        totals_only: Only return the totals of every metric
+        raw_csv: Return the full report in CSV format instead; only use when explicitly asked for
+
+    Returns:
+        rows, columns (name -> type), metrics, totals and, unless totals_only,
+        group_by, sort_by, groups (number of groups) and records
     """
-    return InmobiAPIService(get_access_config()).load(
-        report_id=report_id,
-    )
+    job = _track_known(report_id)
+    if job.state == JobState.FAILED:
+        raise ValueError(f"Inmobi report {report_id} failed: {job.error}")
+    if job.state != JobState.COMPLETED:
+        return (
+            f"Report {report_id} is not downloaded yet (state: {job.state.value}, "
+            f"Inmobi status: {job.report_status}). Check again with check_inmobi_report_status in a few minutes."
+        )
+    if raw_csv:
+        return await asyncio.to_thread(_read_text, job.path)
+
+    table = await asyncio.to_thread(load_report, job.path)
+    group_by = [] if totals_only else (group_by or ["campaign"])
+    return {"report_id": report_id, **aggregate(table, group_by, top_n=top_n, sort_by=sort_by)}
+
+
+def _track_known(report_id: str) -> ReportJob:
+    """Job of a report this server submitted or downloaded; an unknown ID, e.g. a typo, is never polled."""
+    if not (jobs.known(report_id) or registry.contains(report_id)):
+        raise ValueError(
+            f"Unknown Inmobi report ID {report_id!r}, use an ID returned by generate_inmobi_report_ids"
+        )
+    return jobs.track(report_id)
+
+
+_shared_service: Optional[InmobiAPIService] = None
+
+
+@mcp.resource("inmobi://stats")
+def service_stats() -> str:
+    """Access token fetches and tracked report jobs by state."""
+    states = Counter(job.state.value for job in jobs.jobs())
+    return json.dumps({
+        "token_fetches": _shared_service.tokens.fetches if _shared_service else 0,
+        "jobs": dict(states),
+    }, indent=2)
+
+
+def _service() -> InmobiAPIService:
+    """The process-wide API service, sharing one HTTP client and access token across tools and jobs."""
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = InmobiAPIService(get_access_config())
+    return _shared_service
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+jobs = ReportJobManager.from_env(_service)
+registry = ReportRegistry.from_env()
 
 
 async def main():
-    await mcp.run_stdio_async()
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        if _shared_service is not None:
+            await _shared_service.aclose()
@@ -0,0 +1,142 @@
+"""Server-side aggregation of Iron Source report rows."""
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_BREAKDOWNS = "day,campaign"
+
+# Output field -> accepted row keys, compared after dropping case and separators
+METRICS = {
+    "impressions": ("impressions",),
+    "clicks": ("clicks",),
+    "completions": ("completions",),
+    "installs": ("installs", "conversions"),
+    "spend": ("spend", "cost"),
+}
+GROUPS = {
+    "day": {"day": ("date", "day")},
+    "campaign": {"campaign_id": ("campaignid", "campaign"), "campaign_name": ("campaignname",)},
+    "bundle": {"bundle_id": ("titlebundleid", "bundleid", "appbundleid", "bundle"), "title_name": ("titlename", "appname")},
+}
+
+
+def breakdowns_for(group_by: Optional[Sequence[str]]) -> str:
+    """Report breakdowns needed for the groups; bundles come with the title breakdown.
+
+    Raises:
+        ValueError: A group is unknown, checked before the report is fetched
+    """
+    _check_groups(group_by or ())
+    if group_by and "bundle" in group_by:
+        return DEFAULT_BREAKDOWNS + ",title"
+    return DEFAULT_BREAKDOWNS
+
+
+def aggregate(rows: List[Dict[str, Any]], group_by: Sequence[str] = (), totals_only: bool = False) -> Dict[str, Any]:
+    """Sum report metrics, overall and per group, with CPI, CTR and IPM.
+
+    Args:
+        rows: Report rows as returned by the API
+        group_by: Any of "campaign", "day" and "bundle"
+        totals_only: Only return the totals
+
+    Returns:
+        Dictionary with rows (number of report rows), totals and, unless
+        totals_only, group_by and records ordered by spend (by day first when
+        grouped by day)
+    """
+    _check_groups(group_by)
+
+    normalized = [{_key(key): value for key, value in row.items()} for row in rows]
+    values = np.array(
+        [[_number(_field(row, aliases)) for aliases in METRICS.values()] for row in normalized],
+        dtype=np.float64,
+    ).reshape(len(rows), len(METRICS))
+
+    result: Dict[str, Any] = {"rows": len(rows), "totals": _with_rates(values.sum(axis=0, keepdims=True))[0]}
+    if totals_only:
+        return result
+
+    fields = {field: aliases for name in group_by for field, aliases in GROUPS[name].items()}
+    groups: Dict[Tuple[Any, ...], int] = {}
+    group_ids = np.array(
+        [groups.setdefault(_group_key(row, fields), len(groups)) for row in normalized],
+        dtype=np.intp,
+    )
+    sums = np.zeros((len(groups), len(METRICS)), dtype=np.float64)
+    np.add.at(sums, group_ids, values)
+
+    records = [
+        {**dict(zip(fields, key)), **metrics}
+        for key, metrics in zip(groups, _with_rates(sums))
+    ]
+    records.sort(key=lambda record: record["spend"], reverse=True)
+    if "day" in group_by:
+        records.sort(key=lambda record: record["day"] or "")
+    result.update(group_by=list(group_by), records=records)
+    return result
+
+
+def _check_groups(group_by: Sequence[str]) -> None:
+    unknown = [name for name in group_by if name not in GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown group_by {unknown}, expected any of {list(GROUPS)}")
+
+
+def _with_rates(sums: np.ndarray) -> List[Dict[str, Any]]:
+    """Metric sums plus CPI (spend per install), CTR (clicks per impression) and IPM (installs per mille)."""
+    impressions, clicks, installs, spend = (sums[:, list(METRICS).index(name)] for name in ("impressions", "clicks", "installs", "spend"))
+    rates = {
+        "cpi": _ratio(spend, installs),
+        "ctr": _ratio(clicks, impressions),
+        "ipm": _ratio(installs * 1000, impressions),
+    }
+    records = []
+    for i, row in enumerate(sums.tolist()):
+        record = {name: _plain_number(value) for name, value in zip(METRICS, row)}
+        record.update((name, None if np.isnan(rate[i]) else round(float(rate[i]), 4)) for name, rate in rates.items())
+        records.append(record)
+    return records
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise ratio, NaN where the denominator is zero."""
+    return np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator != 0)
+
+
+def _group_key(row: Dict[str, Any], fields: Dict[str, Tuple[str, ...]]) -> Tuple[Any, ...]:
+    key = []
+    for field, aliases in fields.items():
+        value = _field(row, aliases)
+        if field == "day" and isinstance(value, str):
+            value = value[:10]
+        key.append(value)
+    return tuple(key)
+
+
+def _field(row: Dict[str, Any], aliases: Tuple[str, ...]) -> Any:
+    for alias in aliases:
+        if alias in row:
+            return row[alias]
+    return None
+
+
+def _key(name: str) -> str:
+    """Compare field names without case and separators, e.g. campaign_id, campaignId and CampaignID."""
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", ""))
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _plain_number(value: float) -> Any:
+    return int(value) if value.is_integer() else round(value, 4)
@@ -0,0 +1,127 @@
+"""On-disk cache of Iron Source report rows per day and filter set."""
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_days (
+    filter_key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (filter_key, day)
+)
+"""
+
+
+class DayCache:
+    """Report rows of settled days, stored in SQLite.
+
+    Spend for a day keeps changing for a while after it ends, so only days
+    older than settlement_days are cached; those are treated as immutable and
+    never fetched again. Recent days are always fetched from the API.
+
+    Since cached days are served forever, the database lives in a directory
+    private to the current user and is created readable by that user only.
+    """
+
+    def __init__(self, path: str, settlement_days: int = 3):
+        """Open the cache.
+
+        Args:
+            path: SQLite database file, refused when it or its directory is owned by another user
+            settlement_days: Days after which a day's data no longer changes
+        """
+        self.path = path
+        self.settlement_days = settlement_days
+        self.hits = 0
+        self.misses = 0
+        _ensure_private(os.path.dirname(os.path.abspath(path)), 0o700)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600))
+        _ensure_private(path, 0o600)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["DayCache"]:
+        """Create the cache from IRON_SOURCE_CACHE_PATH (default ~/.cache/iron_source/day_cache.sqlite3)
+        and IRON_SOURCE_SETTLEMENT_DAYS (default 3).
+
+        An empty IRON_SOURCE_CACHE_PATH disables the cache.
+        """
+        path = os.getenv(
+            "IRON_SOURCE_CACHE_PATH",
+            os.path.join(os.path.expanduser("~"), ".cache", "iron_source", "day_cache.sqlite3"),
+        )
+        if not path:
+            return None
+        return cls(path, settlement_days=int(os.getenv("IRON_SOURCE_SETTLEMENT_DAYS", "3")))
+
+    def settled(self, day: str) -> bool:
+        """Whether the day is past the settlement window (in UTC)."""
+        today = datetime.now(timezone.utc).date()
+        return date.fromisoformat(day) <= today - timedelta(days=self.settlement_days)
+
+    def get(self, filter_key: str, days: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Cached rows of the given settled days; days not cached are left out."""
+        days = [day for day in days if self.settled(day)]
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            # Chunked to stay below SQLite's bound parameter limit
+            for i in range(0, len(days), 500):
+                chunk = days[i:i + 500]
+                cursor = self._conn.execute(
+                    f"SELECT day, rows FROM report_days WHERE filter_key = ? AND day IN ({','.join('?' * len(chunk))})",
+                    [filter_key, *chunk],
+                )
+                found.update((day, json.loads(rows)) for day, rows in cursor)
+            self.hits += len(found)
+            self.misses += len(days) - len(found)
+        return found
+
+    def put(self, filter_key: str, rows_by_day: Dict[str, List[Dict[str, Any]]]) -> int:
+        """Store the rows of the settled days among rows_by_day; returns the number of days stored."""
+        now = time.time()
+        entries = [
+            (filter_key, day, json.dumps(rows, default=str), now)
+            for day, rows in rows_by_day.items()
+            if self.settled(day)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO report_days VALUES (?, ?, ?, ?)", entries)
+            self._conn.commit()
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            days = self._conn.execute("SELECT COUNT(*) FROM report_days").fetchone()[0]
+        return {
+            "path": self.path,
+            "settlement_days": self.settlement_days,
+            "cached_days": days,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _ensure_private(path: str, mode: int) -> None:
+    """Create a missing directory and restrict path to mode; refuse one owned by another user."""
+    if mode == 0o700:
+        os.makedirs(path, mode=mode, exist_ok=True)
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode):
+        raise PermissionError(f"{path} is a symbolic link")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, mode)
@@ -1,103 +1,302 @@
+import asyncio
+import json
 import os
+import random
 import time
-import requests
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import httpx
 from cachetools import TTLCache
-from typing import List, Dict, Any, Optional
 import logging
 
+from iron_source.aggregate import DEFAULT_BREAKDOWNS
+from iron_source.day_cache import DayCache
+
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
 class IronSourceAPI:
-    def __init__(self):
+    """Async Iron Source client.
+
+    One instance is shared by all tools: it owns a pooled keep-alive
+    AsyncClient, so concurrent report requests overlap instead of queuing.
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: float = 30,
+        max_retries: int = 3,
+        base_interval: float = 3,
+        max_interval: float = 60,
+        shard_days: int = 7,
+        max_concurrency: int = 4,
+        shard_retries: int = 2,
+        cache: Optional[DayCache] = None,
+    ):
+        """Create the client.
+
+        Args:
+            client: HTTP client to use, a pooled keep-alive client is created when omitted
+            timeout: Seconds before a request times out
+            max_retries: Attempts per request
+            base_interval: Base backoff in seconds, doubled on every retry
+            max_interval: Upper bound of a single backoff, also applied to Retry-After
+            shard_days: Days per report request, 1 for daily and 7 for weekly shards
+            max_concurrency: Report requests in flight at once
+            shard_retries: Extra attempts for a shard whose request failed
+            cache: Cache of settled days, every day is fetched when omitted
+        """
         self.base_url = "https://api.ironsrc.com/advertisers/v2"
         self.auth_url = "https://platform.ironsrc.com/partners/publisher/auth"
+        self._client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=10),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self.max_retries = max_retries
+        self.base_interval = base_interval
+        self.max_interval = max_interval
         self._token_cache = TTLCache(maxsize=1, ttl=3600)  # 1 hour cache
+        self._token_lock = asyncio.Lock()
+        self.shard_days = max(1, shard_days)
+        self.shard_retries = shard_retries
+        self._shard_semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = cache
+
+    @classmethod
+    def from_env(cls) -> "IronSourceAPI":
+        """Create the client from IRON_SOURCE_TIMEOUT (default 30), IRON_SOURCE_MAX_RETRIES (default 3),
+        IRON_SOURCE_SHARD_DAYS (default 7) and IRON_SOURCE_MAX_CONCURRENCY (default 4), with the day
+        cache configured by DayCache.from_env."""
+        return cls(
+            timeout=float(os.getenv("IRON_SOURCE_TIMEOUT", "30")),
+            max_retries=int(os.getenv("IRON_SOURCE_MAX_RETRIES", "3")),
+            shard_days=int(os.getenv("IRON_SOURCE_SHARD_DAYS", "7")),
+            max_concurrency=int(os.getenv("IRON_SOURCE_MAX_CONCURRENCY", "4")),
+            cache=DayCache.from_env(),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
 
-    def _get_access_token(self) -> str:
-        """Get access token with caching, similar to Rails.cache implementation"""
+    async def _get_access_token(self) -> str:
+        """Get access token with caching, similar to Rails.cache implementation
+
+        Concurrent callers share a single token request.
+        """
         if "access_token" in self._token_cache:
             return self._token_cache["access_token"]
 
-        try:
-            response = self._make_request(
-                "GET",
-                self.auth_url,
-                headers={
-                    "secretkey": os.getenv("IRON_SOURCE_SECRET_KEY", ""),
-                    "refreshToken": os.getenv("IRON_SOURCE_REFRESH_KEY", "")
-                }
-            )
-
-            if response.status_code != 200:
-                logger.error(f"IronSource API Token error: {response.text}")
-                return ""
+        async with self._token_lock:
+            if "access_token" in self._token_cache:
+                return self._token_cache["access_token"]
 
-            token = response.text.strip('"')
-            self._token_cache["access_token"] = token
-            return token
+            try:
+                response = await self._make_request(
+                    "GET",
+                    self.auth_url,
+                    headers={
+                        "secretkey": os.getenv("IRON_SOURCE_SECRET_KEY", ""),
+                        "refreshToken": os.getenv("IRON_SOURCE_REFRESH_KEY", "")
+                    }
+                )
 
-        except Exception as e:
-            logger.error(f"Error getting IronSource access token: {str(e)}")
-            return ""
+                if response.status_code != 200:
+                    logger.error(f"IronSource API Token error: {response.text}")
+                    return ""
 
-    def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
-        """Make HTTP request with retry logic"""
-        max_retries = 3
-        base_interval = 3
+                token = response.text.strip('"')
+                self._token_cache["access_token"] = token
+                return token
 
-        for attempt in range(max_retries):
+            except Exception as e:
+                logger.error(f"Error getting IronSource access token: {str(e)}")
+                return ""
+
+    async def _make_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Make HTTP request with retry logic
+
+        Transport errors, timeouts and retryable statuses are retried with
+        exponential backoff and jitter, waiting for Retry-After when the
+        response has one. The last response is returned whatever its status.
+        """
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
             try:
-                response = requests.request(method, url, **kwargs)
-                return response
-            except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if last_attempt:
                     raise
-                wait_time = base_interval * (attempt + 1)
-                logger.warning(f"Request failed, retrying in {wait_time}s: {str(e)}")
-                time.sleep(wait_time)
+                wait_time = self._backoff(attempt)
+                logger.warning(f"Request failed, retrying in {wait_time:.1f}s: {str(e)}")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                wait_time = self._retry_after(response)
+                if wait_time is None:
+                    wait_time = self._backoff(attempt)
+                logger.warning(f"Request returned {response.status_code}, retrying in {wait_time:.1f}s")
+            await asyncio.sleep(wait_time)
 
-    def fetch_reports(self, start_date: str, end_date: str, campaign_ids: List[str]) -> List[Dict[str, Any]]:
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter, so concurrent requests do not retry in lockstep."""
+        delay = min(self.max_interval, self.base_interval * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Seconds to wait from a Retry-After header given in seconds or as an HTTP date."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return min(self.max_interval, max(0.0, seconds))
+
+    async def fetch_reports(self, start_date: str, end_date: str, campaign_ids: List[str], breakdowns: str = DEFAULT_BREAKDOWNS) -> List[Dict[str, Any]]:
         """Fetch reports for specific campaign IDs"""
-        return self._fetch_reports(start_date, end_date, campaign_id=",".join(campaign_ids))
+        return await self._fetch_reports(start_date, end_date, breakdowns, campaign_id=",".join(campaign_ids))
 
-    def fetch_reports_by_bundleids(self, start_date: str, end_date: str, bundle_ids: List[str]) -> List[Dict[str, Any]]:
+    async def fetch_reports_by_bundleids(self, start_date: str, end_date: str, bundle_ids: List[str], breakdowns: str = DEFAULT_BREAKDOWNS) -> List[Dict[str, Any]]:
         """Fetch reports for specific bundle IDs"""
-        return self._fetch_reports(start_date, end_date, bundle_id=",".join(bundle_ids))
+        return await self._fetch_reports(start_date, end_date, breakdowns, bundle_id=",".join(bundle_ids))
 
-    def fetch_all_reports(self, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    async def fetch_all_reports(self, start_date: str, end_date: str, breakdowns: str = DEFAULT_BREAKDOWNS) -> List[Dict[str, Any]]:
         """Fetch all reports without filtering"""
-        return self._fetch_reports(start_date, end_date)
+        return await self._fetch_reports(start_date, end_date, breakdowns)
 
-    def _fetch_reports(self, start_date: str, end_date: str, **extra_params) -> List[Dict[str, Any]]:
-        """Common method for fetching reports with different filters"""
-        token = self._get_access_token()
-        if not token:
-            return []
+    async def _fetch_reports(self, start_date: str, end_date: str, breakdowns: str = DEFAULT_BREAKDOWNS, **extra_params) -> List[Dict[str, Any]]:
+        """Common method for fetching reports with different filters
 
+        Settled days are served from the day cache. The missing days are
+        split into shards of shard_days that are fetched concurrently, and
+        all rows are merged in date order.
+        """
         params = {
-            "startDate": start_date,
-            "endDate": end_date,
             "metrics": "impressions,clicks,completions,installs,spend",
-            "breakdowns": "day,campaign",
+            "breakdowns": breakdowns,
             "format": "json",
             **extra_params
         }
 
-        try:
-            response = self._make_request(
-                "GET",
-                f"{self.base_url}/reports",
-                headers={"Authorization": f"Bearer {token}"},
-                params=params
-            )
+        days = date_range(start_date, end_date)
+        filter_key = json.dumps(params, sort_keys=True)
+        cached = await asyncio.to_thread(self.cache.get, filter_key, days) if self.cache else {}
+        missing = [day for day in days if day not in cached]
+        token = await self._get_access_token() if missing else ""
+        if missing and not token:
+            return []
+        shards = [
+            shard
+            for run_start, run_end in day_runs(missing)
+            for shard in date_shards(run_start, run_end, self.shard_days)
+        ]
 
-            if response.status_code != 200:
-                logger.error(f"Error fetching reports: {response.text}")
-                return []
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._fetch_shard(token, shard_start, shard_end, params) for shard_start, shard_end in shards)
+        )
+        by_day, undated = group_by_day(row for rows in results for row in rows)
+        if self.cache and missing and not undated:
+            # Days without rows are stored too, so they are not fetched again
+            await asyncio.to_thread(self.cache.put, filter_key, {day: by_day.get(day, []) for day in missing})
+        logger.info(
+            f"Fetched IronSource reports {start_date}..{end_date}: {len(cached)} of {len(days)} days cached, "
+            f"{len(missing)} fetched in {len(shards)} shards in {time.perf_counter() - started:.2f}s"
+        )
+        return [row for day in days for row in cached.get(day) or by_day.get(day, [])] + undated
 
-            return response.json().get("data")
+    async def _fetch_shard(self, token: str, start_date: str, end_date: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fetch one shard, retrying it on its own when it fails.
 
-        except Exception as e:
-            logger.error(f"Error fetching reports: {str(e)}")
-            return []
+        Raises:
+            RuntimeError: The shard still failed after shard_retries retries, so the result would be incomplete
+        """
+        error = ""
+        for attempt in range(self.shard_retries + 1):
+            async with self._shard_semaphore:
+                try:
+                    response = await self._make_request(
+                        "GET",
+                        f"{self.base_url}/reports",
+                        headers={"Authorization": f"Bearer {token}"},
+                        params={"startDate": start_date, "endDate": end_date, **params}
+                    )
+                    if response.status_code == 200:
+                        return response.json().get("data") or []
+                    error = f"HTTP {response.status_code}: {response.text}"
+                except Exception as e:
+                    error = str(e)
+            logger.warning(f"Error fetching reports {start_date}..{end_date} (attempt {attempt + 1}): {error}")
+            if attempt < self.shard_retries:
+                await asyncio.sleep(self._backoff(attempt))
+        raise RuntimeError(
+            f"Error fetching IronSource reports {start_date}..{end_date} "
+            f"after {self.shard_retries + 1} attempts: {error}"
+        )
+
+
+def date_shards(start_date: str, end_date: str, days: int) -> List[Tuple[str, str]]:
+    """Split an inclusive YYYY-MM-DD range into consecutive ranges of at most days days."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    shards = []
+    while start <= end:
+        shard_end = min(end, start + timedelta(days=days - 1))
+        shards.append((start.isoformat(), shard_end.isoformat()))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """Every day of an inclusive YYYY-MM-DD range."""
+    start = date.fromisoformat(start_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((date.fromisoformat(end_date) - start).days + 1)]
+
+
+def day_runs(days: List[str]) -> List[Tuple[str, str]]:
+    """Group sorted days into (start, end) ranges of consecutive days."""
+    runs: List[Tuple[str, str]] = []
+    for day in days:
+        if runs and date.fromisoformat(runs[-1][1]) + timedelta(days=1) == date.fromisoformat(day):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def group_by_day(rows: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Bucket rows by their day; rows without a recognizable day are returned separately."""
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    undated: List[Dict[str, Any]] = []
+    for row in rows:
+        day = _row_day(row)
+        if day is None:
+            undated.append(row)
+        else:
+            by_day.setdefault(day, []).append(row)
+    return by_day, undated
+
+
+def _row_day(row: Dict[str, Any]) -> Optional[str]:
+    """The YYYY-MM-DD day of a report row, whose day may come as a date or a timestamp."""
+    for key in ("date", "day"):
+        value = row.get(key)
+        if isinstance(value, str) and len(value) >= 10:
+            try:
+                return date.fromisoformat(value[:10]).isoformat()
+            except ValueError:
+                return None
+    return None
@@ -1,36 +1,98 @@
+import json
 from datetime import date, timedelta
+from typing import Any, Optional, Union
 from mcp.server.fastmcp import FastMCP
+from iron_source.aggregate import aggregate, breakdowns_for
 from iron_source.iron_source_api import IronSourceAPI
+from mcp_results import encoded_result
 
 mcp = FastMCP(name="Iron Source Report")
-api = IronSourceAPI()
+api = IronSourceAPI.from_env()
 
 @mcp.tool()
-def fetch_reports(start_date: date, end_date: date, campaign_ids: list[str]) -> list[dict]:
-    """Fetch reports for specific campaign IDs."""
-    return api.fetch_reports(
+@encoded_result
+async def fetch_reports(
+    start_date: date,
+    end_date: date,
+    campaign_ids: list[str],
+    group_by: Optional[list[str]] = None,
+    totals_only: bool = False,
+) -> Union[list[dict], dict]:
+    """Fetch reports for specific campaign IDs.
+
+    With group_by (any of "campaign", "day" and "bundle") or totals_only, only the
+    aggregate is returned: rows (number of report rows), totals and records per
+    group, each with impressions, clicks, completions, installs, spend, cpi, ctr
+    and ipm. Otherwise the report rows are returned.
+    """
+    rows = await api.fetch_reports(
         start_date=start_date.isoformat(),
         end_date=end_date.isoformat(),
-        campaign_ids=campaign_ids
+        campaign_ids=campaign_ids,
+        breakdowns=breakdowns_for(group_by)
     )
+    return _result(rows, group_by, totals_only)
 
 @mcp.tool()
-def fetch_reports_by_bundleids(start_date: date, end_date: date, bundle_ids: list[str]) -> list[dict]:
-    """Fetch reports for specific bundle IDs."""
-    return api.fetch_reports_by_bundleids(
+@encoded_result
+async def fetch_reports_by_bundleids(
+    start_date: date,
+    end_date: date,
+    bundle_ids: list[str],
+    group_by: Optional[list[str]] = None,
+    totals_only: bool = False,
+) -> Union[list[dict], dict]:
+    """Fetch reports for specific bundle IDs.
+
+    With group_by (any of "campaign", "day" and "bundle") or totals_only, only the
+    aggregate is returned: rows (number of report rows), totals and records per
+    group, each with impressions, clicks, completions, installs, spend, cpi, ctr
+    and ipm. Otherwise the report rows are returned.
+    """
+    rows = await api.fetch_reports_by_bundleids(
         start_date=start_date.isoformat(),
         end_date=end_date.isoformat(),
-        bundle_ids=bundle_ids
+        bundle_ids=bundle_ids,
+        breakdowns=breakdowns_for(group_by)
     )
+    return _result(rows, group_by, totals_only)
 
 @mcp.tool()
-def fetch_all_reports(start_date: date, end_date: date) -> list[dict]:
-    """Fetch all reports without filtering."""
-    return api.fetch_all_reports(
+@encoded_result
+async def fetch_all_reports(
+    start_date: date,
+    end_date: date,
+    group_by: Optional[list[str]] = None,
+    totals_only: bool = False,
+) -> Union[list[dict], dict]:
+    """Fetch all reports without filtering.
+
+    With group_by (any of "campaign", "day" and "bundle") or totals_only, only the
+    aggregate is returned: rows (number of report rows), totals and records per
+    group, each with impressions, clicks, completions, installs, spend, cpi, ctr
+    and ipm. Otherwise the report rows are returned.
+    """
+    rows = await api.fetch_all_reports(
         start_date=start_date.isoformat(),
-        end_date=end_date.isoformat()
+        end_date=end_date.isoformat(),
+        breakdowns=breakdowns_for(group_by)
     )
+    return _result(rows, group_by, totals_only)
+
+def _result(rows: list[dict], group_by: Optional[list[str]], totals_only: bool) -> Union[list[dict], dict[str, Any]]:
+    """The report rows, or only their aggregate when group_by or totals_only is given."""
+    if group_by is None and not totals_only:
+        return rows
+    return aggregate(rows, group_by or [], totals_only=totals_only)
+
+@mcp.resource("ironsource://stats/cache")
+def cache_stats() -> str:
+    """Days in the report day cache and cache hits and misses."""
+    return json.dumps(api.cache.stats() if api.cache else {"enabled": False}, indent=2)
 
 async def main():
     """Run the Iron Source MCP server."""
-    await mcp.run_stdio_async()
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        await api.aclose()
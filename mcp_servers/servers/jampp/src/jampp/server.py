@@ -2,17 +2,20 @@ from datetime import date, timedelta
 from mcp.server.fastmcp import FastMCP
 import jampp.integration_configs as integration
 from jampp.jampp_api_service import JamppAPIService
+from mcp_results import encoded_result
 
 mcp = FastMCP(name="Jampp Report")
 
 
 @mcp.tool()
+@encoded_result
 def get_jampp_all_supported_clients() -> list[str]:
     """Get all supported clients for loading Jampp reports."""
     return integration.get_all_supported_clients()
 
 
 @mcp.tool()
+@encoded_result
 def get_jampp_reports(
     client: integration.Client,
     start_date: date,
@@ -0,0 +1,155 @@
+"""Compact JSON encoding of tool results, shared by the feedmob, iron_source and jampp servers.
+
+Tools return their result through encode_result (usually via the encoded_result
+decorator), which serializes it with orjson. Decimal, date and datetime values
+and row mappings are serialized cleanly.
+
+With MCP_RESULT_FORMAT=columnar, every list of records is sent as
+{"columns": [...], "types": [...], "rows": [[...], ...]} so record keys are not
+repeated on every row. The default, rows, keeps the records as objects.
+"""
+import functools
+import inspect
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, TypeVar
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+RESULT_FORMAT = os.getenv("MCP_RESULT_FORMAT", "rows")
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "encoded_bytes": 0, "measured_calls": 0, "rows_bytes": 0, "measured_encoded_bytes": 0}
+
+
+def encoded_result(func: F) -> F:
+    """Decorate a tool so its result is returned as compact JSON text."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return encode_result(await func(*args, **kwargs), name=func.__name__)
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return encode_result(func(*args, **kwargs), name=func.__name__)
+    return wrapper  # type: ignore[return-value]
+
+
+def encode_result(value: Any, name: str = "result") -> str:
+    """Serialize a tool result in the configured format.
+
+    In columnar mode with debug logging enabled, the equivalent row-oriented
+    JSON is serialized too, and the saving is logged and added to
+    result_stats(); otherwise a result is only serialized once.
+    """
+    plain = _plain(value)
+    if RESULT_FORMAT != "columnar":
+        return _dumps(plain).decode()
+
+    encoded = _dumps(to_columnar(plain))
+    measure = logger.isEnabledFor(logging.DEBUG)
+    rows_size = len(_dumps(plain)) if measure else 0
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["encoded_bytes"] += len(encoded)
+        if measure:
+            _stats["measured_calls"] += 1
+            _stats["rows_bytes"] += rows_size
+            _stats["measured_encoded_bytes"] += len(encoded)
+    if not measure:
+        return encoded.decode()
+    logger.debug(
+        "%s: columnar result %d bytes (~%d tokens) instead of %d bytes (~%d tokens), %.1f%% smaller",
+        name,
+        len(encoded),
+        _approx_tokens(len(encoded)),
+        rows_size,
+        _approx_tokens(rows_size),
+        100 * (1 - len(encoded) / rows_size) if rows_size else 0.0,
+    )
+    return encoded.decode()
+
+
+def to_columnar(value: Any) -> Any:
+    """Turn every non-empty list of records into columns, types and row arrays."""
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            return _table(value)
+        return [to_columnar(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    return value
+
+
+def result_stats() -> Dict[str, Any]:
+    """Cumulative bytes of columnar results, and the saving over the row-oriented size of the measured calls."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["format"] = RESULT_FORMAT
+    stats["saved_bytes"] = stats["rows_bytes"] - stats.pop("measured_encoded_bytes")
+    stats["saved_tokens_approx"] = _approx_tokens(stats["saved_bytes"])
+    return stats
+
+
+def _table(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    columns: Dict[str, None] = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    names = list(columns)
+    rows = [[to_columnar(record.get(column)) for column in names] for record in records]
+    types = [_column_type([row[i] for row in rows]) for i in range(len(names))]
+    return {"columns": names, "types": types, "rows": rows}
+
+
+def _column_type(values: List[Any]) -> str:
+    kinds = {_value_type(value) for value in values if value is not None}
+    if not kinds:
+        return "null"
+    if kinds == {"int", "float"}:
+        return "float"
+    return kinds.pop() if len(kinds) == 1 else "mixed"
+
+
+def _value_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, str):
+        return "str"
+    return "json"
+
+
+def _plain(value: Any) -> Any:
+    """Convert mappings (e.g. SQLAlchemy RowMapping), tuples and Decimals to plain JSON types."""
+    if isinstance(value, Mapping):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_plain(item) for item in value]
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() and value.as_tuple().exponent >= 0 else float(value)
+    return value
+
+
+def _dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _approx_tokens(size: int) -> int:
+    """Rough token count of JSON text, about 4 bytes per token."""
+    return size // 4
@@ -0,0 +1,56 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """进程内的简单指标收集: 计数器和最近 N 次耗时的分布"""
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        """记录一次耗时（秒）"""
+        with self._lock:
+            self._timings[name].append(seconds)
+        logger.info("metric %s=%.3fs", name, seconds)
+
+    def incr(self, name: str, value: int = 1):
+        """计数器加一"""
+        with self._lock:
+            self._counters[name] += value
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """返回某个耗时指标的 count / avg / p50 / p95"""
+        with self._lock:
+            values = sorted(self._timings.get(name, ()))
+        if not values:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "p50": values[int(0.5 * (len(values) - 1))],
+            "p95": values[int(0.95 * (len(values) - 1))],
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """所有指标的快照"""
+        with self._lock:
+            names = list(self._timings)
+            counters = dict(self._counters)
+        return {
+            "timings": {name: self.summary(name) for name in names},
+            "counters": counters,
+        }
+
+
+metrics = Metrics()